@@ -1,445 +1,3338 @@
 from PIL import Image
-from os.path import exists
-from os import stat
+from os.path import exists, isfile, isdir, join, dirname, basename, splitext, relpath, abspath, commonpath
+from os import stat, walk, makedirs, cpu_count, urandom, replace, remove, chmod, umask, PathLike, SEEK_END
+from shutil import copyfile
+from tempfile import TemporaryFile, NamedTemporaryFile
 import numpy
 import math
-from textwrap import wrap
+import sys
+import json
+import argparse
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat, islice
+import struct
+import hashlib
+import zlib
+import bz2
+import lzma
+from io import BytesIO
+from contextlib import nullcontext
+from typing import NamedTuple
 
 HEADER_SIZE = 580
+# header ends in R of pixel 193, data start from next pixel
+HEADER_PIXELS = HEADER_SIZE // 3 + 1
+# first bytes of compact header, old header can start with them only for file name of 63 or 64 bytes
+COMPACT_MAGIC = b'\x5e\xa7'
+COMPACT_VERSION = 1
+# version of compact header of one segment of payload spanned over several images
+COMPACT_SPAN_VERSION = 2
+# version of compact header with byte of flags, CRC of header and CRC table of payload chunks
+COMPACT_CHECKED_VERSION = 3
+# bytes of payload checked by one CRC
+CRC_CHUNK = 1 << 16
+# max number of images one payload is spanned over
+MAX_SPAN_COUNT = 1 << 16
+# max length of stored file name in bytes
+MAX_NAME_SIZE = 64
+# filters of resizing, from fastest
+RESAMPLING = {'nearest': Image.NEAREST, 'box': Image.BOX, 'bilinear': Image.BILINEAR}
+# pixels read to get header of any version, compact header has at most 97 bytes without CRC table
+MAX_HEADER_PIXELS = max(HEADER_PIXELS, math.ceil(97 * 8 / 3))
+# number of bits processed at once
+CHUNK_BITS = 1 << 20
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# set in value stored in place of enc_start when it holds options
+OPTIONS_FLAG = 1 << 31
+# set in byte of flags of compact header when stride and offset follow options word as varints
+LAYOUT_FLAG = 1 << 1
+# supported encoding types
+ENC_TYPES = (0, 1, 2, 3, 4, 5)
+# types with payload pixels counted row by row
+ROW_TYPES = (3, 4)
+# rounds of Feistel network shuffling pixels of type 5
+FEISTEL_ROUNDS = 4
+# codecs of payload compression, index is stored in header
+COMPRESSIONS = ('none', 'zlib', 'bz2', 'lzma')
+COMPRESSORS = {1: zlib.compress, 2: bz2.compress, 3: lzma.compress}
+DECOMPRESSORS = {1: zlib.decompressobj, 2: bz2.BZ2Decompressor, 3: lzma.LZMADecompressor}
+# payload is compressed by chunks of this size in parallel
+COMPRESS_CHUNK = 1 << 22
+# bytes from start of payload compressed to choose codec
+COMPRESS_SAMPLE = 1 << 16
+# images searched by batch decode
+IMAGE_EXTENSIONS = ('.png', '.bmp', '.ppm', '.tif', '.tiff')
+# uncompressed formats changed in place of the file, output with other extension is saved as PNG
+RAW_EXTENSIONS = ('.bmp', '.ppm', '.tif', '.tiff')
+# bytes of pixel for raw modes of uncompressed files which can be mapped as r, g, b(, a)
+RAW_MODES = {'RGB': 3, 'RGBA': 4, 'BGR': 3, 'BGRX': 4}
+# errors of Pillow and codecs for unknown, damaged or truncated image file
+IMAGE_ERRORS = (OSError, EOFError, SyntaxError, ValueError, struct.error, zlib.error)
+# channels for every PNG color type
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# estimated bytes of working memory for every byte of pixels and every payload bit in row band
+BAND_COST = 24
+BAND_BIT_COST = 72
+# pairs of values with fewer expected values are left out of chi-square test
+POV_MIN_EXPECTED = 4
+
+
+class Options(NamedTuple):
+    """
+    Options of encoding stored in header
+    """
+    enc_type: int = 0
+    # number of low bits used in every channel
+    depth: int = 1
+    # used channels, bit 0 is R, bit 1 G, bit 2 B and bit 3 A
+    channels: int = 0b0111
+    # every stride-th pixel from offset, for type 4
+    stride: int = 1
+    offset: int = 0
+    # key of pixel order for type 5, it is never stored in header
+    key: str = None
+    # index of codec in COMPRESSIONS
+    compression: int = 0
+    # pixels taken by header, given by header version and length
+    header_pixels: int = HEADER_PIXELS
+    # header is stored row by row (compact header of ROW_TYPES), so payload starts right after it
+    row_header: bool = False
+
+
+class Span(NamedTuple):
+    """
+    Place of segment in payload spanned over several images
+    """
+    # random number shared by all images of one payload
+    set_id: int
+    index: int
+    count: int
+
+
+class Header(NamedTuple):
+    """
+    Header of encoded image
+    """
+    f_type: int
+    enc_type: int
+    file_name: str
+    enc_start: int
+    enc_end: int
+    options: Options
+    # None for payload in one image
+    span: Span = None
+    # payload chunks have CRC table stored after header, enc_start is start of the table then
+    crc: bool = False
+
+
+class StegoError(Exception):
+    """
+    Error of encoding or decoding, code is exit code of program
+    """
+    code = 1
+
+    def __init__(self, message: str, code: int = None):
+        super().__init__(message)
+        if code is not None:
+            self.code = code
+
+
+class InvalidInputError(StegoError):
+    """
+    Missing file, wrong image or wrong option
+    """
+    code = 2
+
+
+class PayloadError(StegoError):
+    """
+    Payload of image is damaged
+    """
+    code = 5
+
+
+class CapacityError(StegoError):
+    """
+    Data do not fit in image
+    """
+    code = 4
+
+
+class HeaderError(StegoError):
+    """
+    Data can not be described by header
+    """
+    code = 42
+
+
+def bits_to_array(bits) -> numpy.ndarray:
+    """
+    Function that converts bits to numpy array of 0/1 values
+    :param bits: string of '0'/'1' characters, list or array of bits
+    :return: numpy.ndarray of uint8
+    """
+    if isinstance(bits, str):
+        return numpy.frombuffer(bits.encode('ascii'), dtype=numpy.uint8) - ord('0')
+
+    return numpy.asarray(bits, dtype=numpy.uint8)
+
+
+def get_row_major_start(height: int, width: int, header_pixels: int = HEADER_PIXELS, row_header: bool = False) -> int:
+    """
+    Function that returns first pixel (row by row) after all header pixels
+    :param height: image height
+    :param width: image width
+    :param header_pixels: number of header pixels
+    :param row_header: header is stored row by row
+    :return: int pixel index
+    """
+    if row_header:
+        return header_pixels
+
+    # header fits in first column
+    if header_pixels <= height:
+        return (header_pixels - 1) * width + 1
+
+    # last row holds the rightmost header pixel
+    return (height - 1) * width + header_pixels // height
+
+
+def to_row_major(pixel: numpy.ndarray, height: int, width: int) -> numpy.ndarray:
+    """
+    Function that converts pixel indexes counted column by column to indexes counted row by row
+    :param pixel: pixel indexes (column-major)
+    :param height: image height
+    :param width: image width
+    :return: numpy.ndarray of pixel indexes (row-major)
+    """
+    x, y = numpy.divmod(pixel, height)
+
+    return y * width + x
+
+
+def get_header_positions(n_bits: int, height: int, width: int, row_header: bool = False) -> tuple:
+    """
+    Function that returns positions of header bits, header is stored column by column
+    unless it is compact header of row by row type
+    :param n_bits: number of header bits
+    :param height: image height
+    :param width: image width
+    :param row_header: header is stored row by row
+    :return: tuple of arrays (pixel index row by row, channel, bit), positions out of image are left out
+    """
+    pixel, channel = numpy.divmod(numpy.arange(n_bits, dtype=numpy.int64), 3)
+    keep = pixel < height * width
+    pixel = pixel[keep] if row_header else to_row_major(pixel[keep], height, width)
+
+    return pixel, channel[keep], numpy.zeros(keep.sum(), dtype=numpy.int64)
+
+
+def get_layout(options: Options, height: int, width: int) -> tuple:
+    """
+    Function that returns where payload pixels start and how far they are from each other
+    :param options: options of encoding
+    :param height: image height
+    :param width: image width
+    :return: tuple (first pixel, stride, bool if pixels are counted row by row)
+    """
+    if options.enc_type == 0:
+        return options.header_pixels, 1, False
+    elif options.enc_type == 1:
+        return options.header_pixels, 2, False
+    elif options.enc_type == 2:
+        return options.header_pixels + 1, 2, False
+    elif options.enc_type == 3:
+        return get_row_major_start(height, width, options.header_pixels, options.row_header), 1, True
+    elif options.enc_type == 4:
+        first = get_row_major_start(height, width, options.header_pixels, options.row_header)
+        return first + options.offset, options.stride, True
+    elif options.enc_type == 5:
+        # all pixels after header, in order given by key
+        return options.header_pixels, 1, False
+
+    # other types encode header only
+    return height * width, 1, True
+
+
+def get_layout_pixels(index: numpy.ndarray, options: Options, height: int, width: int) -> numpy.ndarray:
+    """
+    Function that returns pixels (row by row indexes) of payload pixels with given order in layout
+    :param index: order of payload pixels
+    :param options: options of encoding
+    :param height: image height
+    :param width: image width
+    :return: numpy.ndarray of pixel indexes, pixels out of image are left out (only from end)
+    """
+    first, stride, row_major = get_layout(options, height, width)
+    if options.enc_type == 5:
+        index = index[index < height * width - first]
+        if not index.size:
+            return index
+        # index is sorted run of pixels each repeated for its bits, shuffle every pixel once
+        pixel = permute_pixels(numpy.arange(index[0], index[-1] + 1), height * width - first, options.key)
+        return to_row_major(first + pixel[index - index[0]], height, width)
+
+    pixel = first + stride * index
+    pixel = pixel[pixel < height * width]
+
+    return pixel if row_major else to_row_major(pixel, height, width)
+
+
+def get_layout_index(pixel: numpy.ndarray, options: Options, height: int, width: int) -> numpy.ndarray:
+    """
+    Function that returns order of given pixels in layout, inverse of get_layout_pixels
+    :param pixel: pixel indexes row by row
+    :param options: options of encoding
+    :param height: image height
+    :param width: image width
+    :return: numpy.ndarray of order of every pixel, -1 for pixels out of layout
+    """
+    first, stride, row_major = get_layout(options, height, width)
+    if not row_major:
+        row, column = numpy.divmod(pixel, width)
+        pixel = column * height + row
+    offset = pixel - first
+
+    if options.enc_type == 5:
+        index = numpy.full(pixel.size, -1, dtype=numpy.int64)
+        used = offset >= 0
+        index[used] = permute_pixels(offset[used], height * width - first, options.key, True)
+        return index
+
+    return numpy.where((offset >= 0) & (offset % stride == 0), offset // stride, -1)
+
+
+def get_round_keys(key: str) -> numpy.ndarray:
+    """
+    Function that derives keys of Feistel rounds from user key
+    :param key: user key
+    :return: numpy.ndarray of FEISTEL_ROUNDS uint64 values
+    """
+    if not key:
+        raise InvalidInputError('Key is needed for encryption type 5.')
+
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8 * FEISTEL_ROUNDS, person=b'stego-pixels').digest()
+
+    return numpy.frombuffer(digest, dtype='<u8')
+
+
+def feistel(value: numpy.ndarray, half: int, round_keys: numpy.ndarray, inverse: bool = False) -> numpy.ndarray:
+    """
+    Function that maps values of 2 * half bits to other values of 2 * half bits, every value to different one
+    :param value: numpy.ndarray of uint64 values lower than 1 << 2 * half
+    :param half: number of bits in each half of value
+    :param round_keys: keys of rounds
+    :param inverse: map values back
+    :return: numpy.ndarray of uint64
+    """
+    half = numpy.uint64(half)
+    mask = (numpy.uint64(1) << half) - numpy.uint64(1)
+    left, right = value >> half, value & mask
+
+    # inverse network is the same rounds in reverse order on swapped halves
+    if inverse:
+        left, right, round_keys = right, left, round_keys[::-1]
+
+    for round_key in round_keys:
+        # splitmix64 finalizer of keyed right half
+        mixed = right ^ round_key
+        mixed *= numpy.uint64(0x9E3779B97F4A7C15)
+        mixed ^= mixed >> numpy.uint64(30)
+        mixed *= numpy.uint64(0xBF58476D1CE4E5B9)
+        mixed ^= mixed >> numpy.uint64(27)
+        mixed &= mask
+        mixed ^= left
+        left, right = right, mixed
+
+    if inverse:
+        left, right = right, left
+
+    return left << half | right
+
+
+def permute_pixels(index: numpy.ndarray, domain: int, key: str, inverse: bool = False) -> numpy.ndarray:
+    """
+    Function that returns k-th pixel of keyed order for every k in index without building the whole order,
+    values out of domain are put through the network again until they fall in it (cycle walking)
+    :param index: order of pixels, all lower than domain
+    :param domain: number of pixels to shuffle
+    :param key: user key
+    :param inverse: return order of given pixel offsets instead
+    :return: numpy.ndarray of pixel offsets from 0 to domain - 1
+    """
+    round_keys = get_round_keys(key)
+    half = (max(domain - 1, 1).bit_length() + 1) // 2
+    value = feistel(index.astype(numpy.uint64), half, round_keys, inverse)
+
+    # domain is at least quarter of network size, so few walks are needed
+    while (walk := numpy.flatnonzero(value >= domain)).size:
+        value[walk] = feistel(value[walk], half, round_keys, inverse)
+
+    return value.astype(numpy.int64)
+
+
+def get_payload_positions(start_bit: int, n_bits: int, options: Options, height: int, width: int) -> tuple:
+    """
+    Function that returns positions of payload bits, every channel holds options.depth bits
+    :param start_bit: index of first payload bit
+    :param n_bits: number of payload bits
+    :param options: options of encoding
+    :param height: image height
+    :param width: image width
+    :return: tuple of arrays (pixel index row by row, channel, bit), positions out of image are left out
+    """
+    channels = get_channels(options.channels)
+    slot, plane = numpy.divmod(numpy.arange(start_bit, start_bit + n_bits, dtype=numpy.int64), options.depth)
+    index, channel = numpy.divmod(slot, channels.size)
+    pixel = get_layout_pixels(index, options, height, width)
+
+    return pixel, channels[channel[:pixel.size]], plane[:pixel.size]
+
+
+def get_channels(mask: int) -> numpy.ndarray:
+    """
+    Function that returns indexes of channels in mask
+    :param mask: channel mask, bit 0 is R, bit 1 G, bit 2 B and bit 3 A
+    :return: numpy.ndarray of channel indexes
+    """
+    return numpy.flatnonzero([mask >> channel & 1 for channel in range(4)])
+
+
+def parse_channels(names: str) -> int:
+    """
+    Function that returns channel mask from channel names
+    :param names: channel names, for example 'RGBA' or 'GB'
+    :return: int mask
+    """
+    if not names or any(name not in 'RGBA' for name in names.upper()):
+        raise InvalidInputError('Channels must be some of R, G, B and A.')
+
+    return sum(1 << 'RGBA'.index(name) for name in set(names.upper()))
+
+
+def get_channel_names(mask: int) -> str:
+    """
+    Function that returns channel names from channel mask
+    :param mask: channel mask
+    :return: str
+    """
+    return ''.join('RGBA'[channel] for channel in get_channels(mask))
+
+
+def has_alpha(input_image: Image) -> bool:
+    """
+    Function that checks if image has alpha channel or transparency, which becomes alpha channel
+    :param input_image: image, pixels are not decoded
+    :return: bool
+    """
+    return 'A' in input_image.getbands() or 'transparency' in input_image.info
+
+
+def carrier_to_array(input_image: Image, options: Options) -> numpy.ndarray:
+    """
+    Function that returns copy of image pixels to encode in, images without
+    r, g and b channels (grayscale, palette) are converted to RGB or RGBA first
+    :param input_image: image to encode in
+    :param options: options of encoding
+    :return: numpy.ndarray (height, width, channels)
+    """
+    if input_image.mode not in ('RGB', 'RGBA'):
+        input_image = input_image.convert('RGBA' if has_alpha(input_image) else 'RGB')
+
+    if options.channels & 0b1000 and input_image.mode != 'RGBA':
+        raise InvalidInputError('Image has no alpha channel to encode in.')
+
+    return numpy.array(input_image)
+
+
+def index_values(pixels: numpy.ndarray, pixel: numpy.ndarray, channel: numpy.ndarray) -> tuple:
+    """
+    Function that returns array of values and index of given pixels and channels in it, contiguous array
+    is indexed as list of pixels, other arrays (mapped from file) by row and column so nothing is copied
+    :param pixels: array of image (height, width, channels)
+    :param pixel: pixel indexes row by row
+    :param channel: channel indexes
+    :return: tuple (array, tuple of index arrays)
+    """
+    if pixels.flags.c_contiguous:
+        return pixels.reshape(-1, pixels.shape[2]), (pixel, channel)
+
+    row, column = numpy.divmod(pixel, pixels.shape[1])
+
+    return pixels, (row, column, channel)
+
+
+def write_lsb(pixels: numpy.ndarray, positions: tuple, bits: numpy.ndarray) -> None:
+    """
+    Function that puts bits to low bits of given positions
+    :param pixels: array of image (height, width, channels), changed in place
+    :param positions: tuple of arrays (pixel index row by row, channel, bit)
+    :param bits: bits to put there, bits over number of positions are skipped
+    :return: None
+    """
+    pixel, channel, plane = positions
+    values, index = index_values(pixels, pixel, channel)
+    bits = bits[:pixel.size]
+    depth = int(plane.max(initial=0)) + 1
+
+    # one bit of every value at once so no value is written twice in one step
+    for bit in range(depth):
+        selected = plane == bit if depth > 1 else slice(None)
+        at = tuple(part[selected] for part in index)
+        values[at] = (values[at] & numpy.uint8(0xFF ^ 1 << bit)) | bits[selected] << bit
+
+
+def read_lsb(pixels: numpy.ndarray, positions: tuple) -> numpy.ndarray:
+    """
+    Function that returns low bits of given positions
+    :param pixels: array of image (height, width, channels), can hold only first rows of image
+    :param positions: tuple of arrays (pixel index row by row, channel, bit)
+    :return: numpy.ndarray of bits
+    """
+    pixel, channel, plane = positions
+    values, index = index_values(pixels, pixel, channel)
+
+    return values[index] >> plane.astype(numpy.uint8) & 1
+
+
+def embed_header(pixels: numpy.ndarray, header, row_header: bool = False) -> None:
+    """
+    Function that puts header bits to LSB of first pixels
+    :param pixels: array of image (height, width, channels), changed in place
+    :param header: header string or array of bits
+    :param row_header: header is stored row by row
+    :return: None
+    """
+    header_bits = get_header_bits(header)
+    write_lsb(pixels, get_header_positions(header_bits.size, *pixels.shape[:2], row_header), header_bits)
+
+
+def get_header_bits(header) -> numpy.ndarray:
+    """
+    Function that returns header bits which are stored in image
+    :param header: header string or array of bits
+    :return: numpy.ndarray of bits
+    """
+    header_bits = bits_to_array(header)
+
+    # last bit of old header was never stored by the encode loop, keep it that way
+    if header_bits.size == HEADER_SIZE:
+        return header_bits[:HEADER_SIZE - 1]
+
+    return header_bits
+
+
+def embed_bits(pixels: numpy.ndarray, bits: numpy.ndarray, start_bit: int, options: Options) -> bool:
+    """
+    Function that puts payload bits starting at given payload bit index to image
+    :param pixels: array of image (height, width, channels), changed in place
+    :param bits: array of bits
+    :param start_bit: index of first bit in the payload
+    :param options: options of encoding
+    :return: bool if all bits fit in image
+    """
+    positions = get_payload_positions(start_bit, bits.size, options, *pixels.shape[:2])
+    write_lsb(pixels, positions, bits)
+
+    return bits.size > 0 and positions[0].size == bits.size
+
+
+def get_chunk_bits(options: Options, workers: int = None) -> int:
+    """
+    Function that returns number of payload bits in one chunk, chunk holds whole bytes and whole pixels,
+    so chunks never share a pixel and can be written at once, CHUNK_BITS are split between threads
+    so positions of chunks in work take the same memory for any number of threads
+    :param options: options of encoding
+    :param workers: number of threads, number of CPUs by default
+    :return: int
+    """
+    step = math.lcm(8, get_channels(options.channels).size * options.depth)
+
+    return max(CHUNK_BITS // (workers or cpu_count()) // step, 1) * step
+
+
+def map_threads(function, items, workers: int = None):
+    """
+    Function that calls function for items in pool of threads, only a few items are taken ahead,
+    results come in order of items
+    :param function: function of one item
+    :param items: iterable of items
+    :param workers: number of threads, number of CPUs by default
+    :return: generator of results
+    """
+    items = iter(items)
+    workers = workers or cpu_count()
+    if workers == 1:
+        yield from map(function, items)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while batch := list(islice(items, workers * 2)):
+            yield from executor.map(function, batch)
+
+
+def encode_array(input_image: Image, bits_data, header: str, options: Options, workers: int = None) -> Image:
+    """
+    Function that puts header and data bits to image in bulk array operations
+    :param input_image: input_image in which the data are encoded
+    :param bits_data: data of bits (either string of bits or array of bits)
+    :param header: header string of bits
+    :param options: options of encoding
+    :param workers: number of threads, number of CPUs by default
+    :return: Image
+    """
+    pixels = carrier_to_array(input_image, options)
+    embed_header(pixels, header, options.row_header)
+
+    bits_data = bits_to_array(bits_data)
+    chunk_bits = get_chunk_bits(options, workers)
+    starts = range(0, bits_data.size, chunk_bits)
+    for _ in map_threads(lambda start: embed_bits(pixels, bits_data[start:start + chunk_bits], start, options),
+                         starts, workers):
+        pass
+
+    return Image.fromarray(pixels)
+
+
+def embed_stream(pixels: numpy.ndarray, stream, options: Options, workers: int = None) -> None:
+    """
+    Function that reads stream by chunks and puts chunks to their places in image in pool of threads,
+    so only a few chunks of the payload are in memory at once
+    :param pixels: array of image (height, width, channels), changed in place
+    :param stream: readable binary file-like object
+    :param options: options of encoding
+    :param workers: number of threads, number of CPUs by default
+    :return: None
+    """
+    chunk_bits = get_chunk_bits(options, workers)
+    chunks = iter(lambda: stream.read(chunk_bits // 8), b'')
+
+    def embed_chunk(item: tuple) -> bool:
+        number, chunk = item
+        bits = numpy.unpackbits(numpy.frombuffer(chunk, dtype=numpy.uint8))
+        return embed_bits(pixels, bits, number * chunk_bits, options)
+
+    for fits in map_threads(embed_chunk, enumerate(chunks), workers):
+        # rest of the file would not fit anyway
+        if not fits:
+            break
+
+
+def encode_stream(input_image: Image, stream, header: str, options: Options, workers: int = None) -> Image:
+    """
+    Function that puts header and stream to image, stream is read by chunks
+    :param input_image: input_image in which the data are encoded
+    :param stream: readable binary file-like object
+    :param header: header string of bits
+    :param options: options of encoding
+    :param workers: number of threads, number of CPUs by default
+    :return: Image
+    """
+    pixels = carrier_to_array(input_image, options)
+    embed_header(pixels, header, options.row_header)
+    embed_stream(pixels, stream, options, workers)
+
+    return Image.fromarray(pixels)
+
+
+def encode_file(input_image: Image, file_name: str, header: str, options: Options, workers: int = None) -> Image:
+    """
+    Function that puts header and file to image, file is read by chunks
+    :param input_image: input_image in which the data are encoded
+    :param file_name: file to encode
+    :param header: header string of bits
+    :param options: options of encoding
+    :param workers: number of threads, number of CPUs by default
+    :return: Image
+    """
+    with open(file_name, 'rb') as f:
+        return encode_stream(input_image, f, header, options, workers)
+
+
+def encode(user_input: str, image: Image, header: str, options: Options, workers: int = None) -> Image:
+    """
+    Function to encode
+    :param user_input: user input string
+    :param image: Image
+    :param header:
+    :param options: options of encoding
+    :param workers: number of threads, number of CPUs by default
+    :return: Image
+    """
+    if is_file(user_input):
+        # can do this as in this point I know it exist
+        return encode_file(image, user_input, header, options, workers)
+    else:
+        return encode_array(image, convert_text_to_bits(user_input), header, options, workers)
+
+
+def open_payload(u_input: str):
+    """
+    Function that returns payload as binary file-like object
+    :param u_input: text or file name to encode
+    :return: file object or BytesIO of UTF-8 text
+    """
+    if is_file(u_input):
+        return open(u_input, 'rb')
+
+    return BytesIO(u_input.encode('utf-8'))
+
+
+def load_payload(u_input) -> numpy.ndarray:
+    """
+    Function that returns payload as array of bytes, file is mapped so it is not read to memory
+    :param u_input: text, file name to encode or temporary file of compressed payload from compress_stream
+    :return: numpy.ndarray of bytes
+    """
+    if not isinstance(u_input, str):
+        if not u_input.seek(0, SEEK_END):
+            return numpy.zeros(0, dtype=numpy.uint8)
+        return numpy.memmap(u_input, dtype=numpy.uint8, mode='r')
+
+    if not is_file(u_input):
+        return numpy.frombuffer(u_input.encode('utf-8'), dtype=numpy.uint8)
+
+    if not stat(u_input).st_size:
+        return numpy.zeros(0, dtype=numpy.uint8)
+
+    return numpy.memmap(u_input, dtype=numpy.uint8, mode='r')
+
+
+def convert_text_to_bits(text: str) -> str:
+    """
+    Converts text to string of bits of its UTF-8 bytes
+    :param text: text to be converted
+    :return: converted string
+    """
+    return ''.join(format(i, '08b') for i in text.encode('utf-8'))
+
+
+def set_header(u_input: str, options: Options, legacy: bool = False) -> numpy.ndarray:
+    """
+    Function that sets header info
+    :param u_input: text or file name to encode
+    :param options: options of encoding
+    :param legacy: build old 580 bits header
+    :return: numpy.ndarray of bits
+    """
+    crcs = None
+    if not legacy:
+        with open_payload(u_input) as stream:
+            crcs = get_chunk_crcs(stream)
+
+    if is_file(u_input):
+        return build_header(1, u_input, stat(u_input).st_size, options, legacy, crcs=crcs)
+
+    return build_header(0, '', len(u_input.encode('utf-8')), options, legacy, crcs=crcs)
+
+
+def build_header(f_type: int, file_name: str, size: int, options: Options, legacy: bool = False,
+                 span: Span = None, crcs: bytes = None) -> numpy.ndarray:
+    """
+    Function that checks options and builds header bits
+    :param f_type: 0 for text, 1 for file
+    :param file_name: file name to store, empty for text
+    :param size: payload size in bytes, size of segment for spanned payload
+    :param options: options of encoding
+    :param legacy: build old 580 bits header
+    :param span: place of segment for payload spanned over several images
+    :param crcs: CRC table of payload from get_chunk_crcs, None when only length of header is needed
+    :return: numpy.ndarray of bits
+    """
+    if options.enc_type not in ENC_TYPES:
+        raise InvalidInputError('Unknown encryption type.')
+    if options.depth not in range(1, 5):
+        raise InvalidInputError('Depth must be from 1 to 4.')
+    if options.channels not in range(1, 16):
+        raise InvalidInputError('Channels must be some of R, G, B and A.')
+    if (options.enc_type == 5) != bool(options.key):
+        raise InvalidInputError('Key is used only by encryption type 5 and it needs one.')
+    if options.enc_type != 4 and (options.stride, options.offset) != (1, 0):
+        raise InvalidInputError('Stride and offset are used only by encryption type 4.')
+    if options.stride < 1 or options.offset < 0:
+        raise InvalidInputError('Stride must be from 1 and offset from 0.')
+    if legacy and (options.stride > 4096 or options.offset > 2047):
+        raise InvalidInputError('Stride must be up to 4096 and offset up to 2047 with old header.')
+    if options.compression not in range(len(COMPRESSIONS)):
+        raise InvalidInputError('Unknown compression.')
+    if len(file_name.encode('utf-8')) > MAX_NAME_SIZE:
+        raise InvalidInputError('File name to store is too long.')
+    if span is not None and (legacy or span.count not in range(1, MAX_SPAN_COUNT + 1)
+                             or span.index not in range(span.count) or span.set_id not in range(1 << 32)):
+        raise InvalidInputError('Payload can be spanned over at most {} images with compact header.'.format(
+            MAX_SPAN_COUNT))
+
+    if legacy:
+        return bits_to_array(build_legacy_header(f_type, file_name, size, options))
+
+    header = build_compact_header(f_type, file_name, size, options, span)
+    header += crcs if crcs is not None else bytes(4 * get_chunk_count(size))
+
+    return numpy.unpackbits(numpy.frombuffer(header, dtype=numpy.uint8))
+
+
+def build_legacy_header(f_type: int, file_name: str, size: int, options: Options) -> str:
+    """
+    Function that builds old header string of bits
+    :param f_type: 0 for text, 1 for file
+    :param file_name: file name to store, empty for text
+    :param size: payload size in bytes
+    :param options: options of encoding
+    :return: str
+    """
+    file_name = convert_text_to_bits(file_name).rjust(512, '0')
+    enc_start = format(get_options_word(options), '032b')
+    enc_end = format(size * 8 * get_size_factor(options.enc_type) + HEADER_SIZE, 'b')
+
+    if len(enc_end) > 32:
+        raise HeaderError('Program does not allow this big encryption.')
+
+    return str(f_type) + format(options.enc_type, '03b') + file_name + enc_start + enc_end.rjust(32, '0')
+
+
+def build_compact_header(f_type: int, file_name: str, size: int, options: Options, span: Span = None) -> bytes:
+    """
+    Function that builds compact header: magic, byte of version, flags and encoding type, byte of flags,
+    4 bytes set ID with varint index and count only for spanned payload,
+    options word only when options are not default, varint stride and offset only when they are not default,
+    varint size in bytes, varint long file name
+    and CRC of all of it, CRC table of payload chunks follows the header
+    :param f_type: 0 for text, 1 for file
+    :param file_name: file name to store, empty for text
+    :param size: payload size in bytes
+    :param options: options of encoding
+    :param span: place of segment for payload spanned over several images
+    :return: bytes
+    """
+    name = file_name.encode('utf-8')
+    word = get_options_word(options, False)
+    has_options = bool(word & OPTIONS_FLAG)
+    has_layout = (options.stride, options.offset) != (1, 0)
+    header = COMPACT_MAGIC + bytes([COMPACT_CHECKED_VERSION << 6 | f_type << 5 | bool(name) << 4 | has_options << 3
+                                    | options.enc_type, (span is not None) | has_layout * LAYOUT_FLAG])
+
+    if span is not None:
+        header += struct.pack('>I', span.set_id) + get_varint(span.index) + get_varint(span.count)
+    if has_options:
+        header += struct.pack('>I', word)
+    if has_layout:
+        header += get_varint(options.stride - 1) + get_varint(options.offset)
+    header += get_varint(size)
+    if name:
+        header += get_varint(len(name)) + name
+
+    return header + struct.pack('>I', zlib.crc32(header))
+
+
+def get_chunk_count(size: int) -> int:
+    """
+    Function that returns number of payload chunks checked by CRC
+    :param size: payload size in bytes
+    :return: int
+    """
+    return -(-size // CRC_CHUNK)
+
+
+def get_chunk_crcs(stream) -> bytes:
+    """
+    Function that returns CRC table of stream from its position, stream is then set back to the position
+    :param stream: readable and seekable binary file-like object
+    :return: bytes, 4 bytes CRC of every CRC_CHUNK bytes
+    """
+    position = stream.tell()
+    crcs = b''.join(struct.pack('>I', zlib.crc32(chunk)) for chunk in iter(lambda: stream.read(CRC_CHUNK), b''))
+    stream.seek(position)
+
+    return crcs
+
+
+def check_chunks(chunks, crcs: bytes):
+    """
+    Function that checks CRC of every CRC_CHUNK bytes of payload as they come
+    :param chunks: iterable of bytes of payload
+    :param crcs: CRC table of payload
+    :return: generator of checked bytes, PayloadError is raised at first damaged chunk
+    """
+    expected = struct.unpack('>{}I'.format(len(crcs) // 4), crcs)
+    data = bytearray()
+    number = 0
+
+    for chunk in chunks:
+        data += chunk
+        while len(data) >= CRC_CHUNK:
+            yield check_chunk(bytes(data[:CRC_CHUNK]), number, expected)
+            del data[:CRC_CHUNK]
+            number += 1
+
+    # last chunk is shorter, missing chunks mean image is smaller than header says
+    if data or number < len(expected):
+        yield check_chunk(bytes(data), number, expected)
+
+
+def check_chunk(data: bytes, number: int, expected: tuple) -> bytes:
+    """
+    Function that checks CRC of one chunk of payload
+    :param data: bytes of chunk
+    :param number: index of chunk
+    :param expected: CRC of every chunk
+    :return: data
+    """
+    if number >= len(expected) or zlib.crc32(data) != expected[number]:
+        raise PayloadError('Chunk {} of payload is damaged.'.format(number + 1))
+
+    return data
+
+
+def get_varint(value: int) -> bytes:
+    """
+    Function that returns int as varint, 7 bits in every byte from lowest, high bit is set when more bytes follow
+    :param value: int from 0
+    :return: bytes
+    """
+    data = bytearray()
+
+    while value > 0x7F:
+        data.append(value & 0x7F | 0x80)
+        value >>= 7
+    data.append(value)
+
+    return bytes(data)
+
+
+def read_varint(data: bytes, position: int) -> tuple:
+    """
+    Function that reads varint from data
+    :param data: bytes
+    :param position: index of first byte of varint
+    :return: tuple (int value, index of byte after varint)
+    """
+    value = shift = 0
+
+    while True:
+        byte = data[position]
+        value |= (byte & 0x7F) << shift
+        position += 1
+        shift += 7
+        if not byte & 0x80:
+            return value, position
+
+
+def get_header_pixels(header) -> int:
+    """
+    Function that returns number of pixels taken by header
+    :param header: header string or array of bits
+    :return: int
+    """
+    return math.ceil(len(header) / 3)
+
+
+def get_header_options(options: Options, header) -> Options:
+    """
+    Function that returns options with place of given header, compact header of row by row types
+    is stored row by row, old header keeps its place in first column
+    :param options: options of encoding
+    :param header: header string or array of bits
+    :return: Options
+    """
+    return options._replace(header_pixels=get_header_pixels(header),
+                            row_header=len(header) != HEADER_SIZE and options.enc_type in ROW_TYPES)
+
+
+def get_options_word(options: Options, layout: bool = True) -> int:
+    """
+    Function that returns value stored in place of enc_start, default options keep
+    the old enc_start value so such images are the same as before
+    :param options: options of encoding
+    :param layout: pack stride and offset too, compact header stores them as varints instead
+    :return: int
+    """
+    if options._replace(key=None, header_pixels=HEADER_PIXELS, row_header=False) == Options(options.enc_type):
+        return HEADER_SIZE + 1
+
+    word = OPTIONS_FLAG | (options.depth - 1) << 29 | options.channels << 25 | options.compression << 23
+
+    return word | (options.stride - 1) << 11 | options.offset if layout else word
+
+
+def parse_options(enc_type: int, word: int) -> Options:
+    """
+    Function that returns options from value stored in place of enc_start
+    :param enc_type: encoding type
+    :param word: stored value
+    :return: Options
+    """
+    if not word & OPTIONS_FLAG:
+        return Options(enc_type)
+
+    return Options(
+        enc_type,
+        depth=(word >> 29 & 3) + 1,
+        channels=word >> 25 & 15,
+        compression=word >> 23 & 3,
+        stride=(word >> 11 & 0xFFF) + 1,
+        offset=word & 0x7FF,
+    )
+
+
+def resolve_compression(options: Options, stream) -> Options:
+    """
+    Function that returns options with compression given by name changed to codec index,
+    'auto' chooses codec by compressing start of the payload
+    :param options: options of encoding, compression can be index or name from COMPRESSIONS or 'auto'
+    :param stream: readable and seekable binary file-like object of payload
+    :return: Options
+    """
+    compression = options.compression
+
+    if compression == 'auto':
+        compression = choose_compression(stream)
+    elif isinstance(compression, str):
+        if compression not in COMPRESSIONS:
+            raise InvalidInputError('Compression must be one of none, zlib, bz2, lzma and auto.')
+        compression = COMPRESSIONS.index(compression)
+
+    return options._replace(compression=compression)
+
+
+def choose_compression(stream) -> int:
+    """
+    Function that compresses sample from current position of stream by every codec and returns the best one,
+    slower codec is chosen only when its output is clearly smaller
+    :param stream: readable and seekable binary file-like object
+    :return: int index of codec, 0 when compression does not pay off
+    """
+    position = stream.tell()
+    sample = stream.read(COMPRESS_SAMPLE)
+    stream.seek(position)
+
+    best, best_size = 0, len(sample) * 0.9
+    for compression, compress in COMPRESSORS.items():
+        size = len(compress(sample))
+        if size < best_size * 0.95:
+            best, best_size = compression, size
+
+    return best
+
+
+def compress_stream(stream, compression: int, workers: int = None):
+    """
+    Function that compresses stream by chunks in pool of threads, every chunk is stored as its own
+    compressed stream, only a few chunks are read ahead and compressed data go to temporary file
+    :param stream: readable binary file-like object
+    :param compression: index of codec
+    :param workers: number of threads, number of CPUs by default
+    :return: temporary file with compressed data at position 0
+    """
+    compressed = TemporaryFile()
+    chunks = iter(lambda: stream.read(COMPRESS_CHUNK), b'')
+
+    try:
+        for data in map_threads(COMPRESSORS[compression], chunks, workers):
+            compressed.write(data)
+    except BaseException:
+        compressed.close()
+        raise
+
+    compressed.seek(0)
+
+    return compressed
+
+
+def decompress_chunks(chunks, compression: int):
+    """
+    Function that decompresses chunks of data as they come, data can hold several compressed streams
+    :param chunks: iterable of bytes
+    :param compression: index of codec
+    :return: generator of decompressed bytes
+    """
+    decompressor = None
+
+    for data in chunks:
+        while data:
+            if decompressor is None:
+                decompressor = DECOMPRESSORS[compression]()
+            yield decompressor.decompress(data)
+            if not decompressor.eof:
+                break
+            # next chunk was compressed on its own
+            data = decompressor.unused_data
+            decompressor = None
+
+
+def get_capacity(width: int, height: int, options: Options) -> int:
+    """
+    Function that returns how many payload bits fit in image
+    :param width: image width
+    :param height: image height
+    :param options: options of encoding
+    :return: int number of bits
+    """
+    first, stride, _ = get_layout(options, height, width)
+    # pixels first, first + stride, ... before end of image
+    pixels = max(-(-(width * height - first) // stride), 0)
+
+    return pixels * get_channels(options.channels).size * options.depth
+
+
+def get_layout_capacities(width: int, height: int, options: Options, size: int = 0, file_name: str = '') -> dict:
+    """
+    Function that returns how many payload bytes fit in image for every encoding type with depth
+    and channels of options, stride and offset are used by type 4 only
+    :param width: image width
+    :param height: image height
+    :param options: options of encoding
+    :param size: payload size in bytes, header with CRC table of this payload is left out
+    :param file_name: file name to store in header, empty for text
+    :return: dict {encoding type: number of bytes}
+    """
+    capacities = {}
+
+    for enc_type in ENC_TYPES:
+        layout = options._replace(enc_type=enc_type, key='key' if enc_type == 5 else None)
+        if enc_type != 4:
+            layout = layout._replace(stride=1, offset=0)
+        header = build_header(1 if file_name else 0, file_name, size, layout)
+        capacities[enc_type] = get_capacity(width, height, get_header_options(layout, header)) // 8
+
+    return capacities
+
+
+def get_image_size(image) -> tuple:
+    """
+    Function that returns size of image and if it has alpha channel, pixels are not decoded
+    :param image: Image or image file name
+    :return: tuple (width, height, bool if alpha channel can be used)
+    """
+    if isinstance(image, Image.Image):
+        return image.width, image.height, has_alpha(image)
+
+    with open_image(image) as opened:
+        return opened.width, opened.height, has_alpha(opened)
+
+
+def open_image(file_name, name: str = None) -> Image:
+    """
+    Function that opens image file, pixels are not decoded yet
+    :param file_name: image file name or binary file-like object
+    :param name: name of image for error message, file_name by default
+    :return: Image
+    """
+    try:
+        return Image.open(file_name)
+    except FileNotFoundError:
+        raise InvalidInputError('Image {} does not exist.'.format(name or file_name))
+    except IMAGE_ERRORS:
+        raise InvalidInputError('Image {} can not be read.'.format(name or file_name))
+
+
+def load_pixels(image: Image, file_name) -> Image:
+    """
+    Function that decodes pixels of opened image, so damaged or truncated data are found before anything is written
+    :param image: Image from open_image
+    :param file_name: image file name for error message
+    :return: Image
+    """
+    try:
+        image.load()
+    except IMAGE_ERRORS:
+        raise InvalidInputError('Image {} is damaged or truncated.'.format(file_name))
+
+    return image
+
+
+def plan_options(image, size: int, file_name: str = '', options: Options = Options(),
+                 legacy_header: bool = False) -> Options:
+    """
+    Function that returns options with lowest depth and then fewest channels in which payload fits,
+    other options are kept, only size of image is read
+    :param image: Image or image file name
+    :param size: payload size in bytes
+    :param file_name: file name to store in header
+    :param options: options of encoding, depth and channels are chosen
+    :param legacy_header: use old 580 bits header
+    :return: Options with header_pixels of the header
+    """
+    width, height, alpha = get_image_size(image)
+    masks = sorted(range(1, 16 if alpha else 8), key=lambda mask: (bin(mask).count('1'), mask))
+
+    for depth in range(1, 5):
+        for channels in masks:
+            candidate = options._replace(depth=depth, channels=channels)
+            header = build_header(1 if file_name else 0, file_name, size, candidate, legacy_header)
+            candidate = get_header_options(candidate, header)
+            if size * 8 <= get_capacity(width, height, candidate):
+                return candidate
+
+    raise CapacityError('The file/text to encode is too big for any depth and channels.')
+
+
+def get_size_factor(enc_type: int) -> int:
+    """
+    Function that returns how many pixels are taken for every pixel with data
+    :param enc_type: encoding type
+    :return: int
+    """
+    # even and odd pixels types skip every other pixel
+    return 2 if enc_type in (1, 2) else 1
+
+
+def validate_and_get_size(u_input: str) -> int:
+    """
+    File that validates user input and returns it size in bits
+    :param u_input: user input
+    :return: int size in bits
+    """
+    size = 0
+    # same check as when header is set
+    if is_file(u_input):
+        # get file size in bits
+        size = stat(u_input).st_size * 8 + HEADER_SIZE
+    else:
+        # get text input size in bits
+        size = len(u_input.encode('utf-8')) * 8 + HEADER_SIZE
+
+    return size
+
+
+def plan_resize(width: int, height: int, n_bits: int, options: Options) -> tuple:
+    """
+    Function that returns smallest size with the same aspect ratio and at least the given size
+    in which payload fits, starts from the estimate by area and checks exact capacity
+    :param width: image width
+    :param height: image height
+    :param n_bits: payload size in bits
+    :param options: options of encoding with header_pixels of the header
+    :return: tuple (width, height)
+    """
+    def get_size(new_width: int) -> tuple:
+        return new_width, max(height, math.ceil(new_width * height / width))
+
+    capacity = max(get_capacity(width, height, options), 1)
+    new_width = max(width, math.floor(width * math.sqrt(n_bits / capacity)))
+
+    # estimate ignores pixels taken by header, so move to smallest fitting width both ways
+    while new_width > width and get_capacity(*get_size(new_width - 1), options) >= n_bits:
+        new_width -= 1
+    while get_capacity(*get_size(new_width), options) < n_bits:
+        new_width += 1
+
+    return get_size(new_width)
+
+
+def resize_image(init_image: Image, size: tuple, resample: str = 'box') -> Image:
+    """
+    Function that resizes image
+    :param init_image: image to encode in
+    :param size: new (width, height)
+    :param resample: filter from RESAMPLING, nearest is fastest, bilinear smoothest
+    :return: Image
+    """
+    if resample not in RESAMPLING:
+        raise InvalidInputError('Resampling must be one of nearest, box and bilinear.')
+
+    return init_image.resize(size, RESAMPLING[resample])
+
+
+def get_output_file(file_output: str) -> str:
+    """
+    Function that returns output image file name, PNG is used unless uncompressed format is given
+    :param file_output: output file name without extension or with extension from RAW_EXTENSIONS
+    :return: str
+    """
+    return file_output if file_output.lower().endswith(RAW_EXTENSIONS) else file_output + '.png'
+
+
+def encode_mapped(file_name: str, stream, header, options: Options, workers: int = None) -> None:
+    """
+    Function that puts header and stream right to pixels of uncompressed image file, nothing else is read or written
+    :param file_name: image file name, see map_pixels
+    :param stream: readable binary file-like object
+    :param header: header string or array of bits
+    :param options: options of encoding
+    :param workers: number of threads, number of CPUs by default
+    :return: None
+    """
+    pixels = map_pixels(file_name, 'r+')
+    embed_header(pixels, header, options.row_header)
+    embed_stream(pixels, stream, options, workers)
+    pixels.flush()
+
+
+def encode_to_file(encryption_data: str, image_to_encode_in: str, file_output: str, options: Options,
+                   resize: bool = False, legacy_header: bool = False, resample: str = 'box',
+                   max_memory: int = None, workers: int = None, details: dict = None) -> int:
+    """
+    Function that encodes text or file to image and saves it without asking anything
+    :param encryption_data: name of existing file to encode, anything else is encoded as text
+    :param image_to_encode_in: image file name
+    :param file_output: output file name without extension (saved as PNG) or with extension of uncompressed format
+    :param options: options of encoding
+    :param resize: make image bigger when data do not fit
+    :param legacy_header: use old 580 bits header
+    :param resample: filter used when image is resized, one of RESAMPLING
+    :param max_memory: memory ceiling in bytes, PNG carrier saved as PNG is then processed by bands of rows
+    :param workers: number of threads, number of CPUs by default
+    :param details: dict which gets bands from get_band_info when image is processed by bands
+    :return: int payload size in bytes
+    """
+    size_in_bits = validate_and_get_size(encryption_data)
+    payload = None
+
+    with open_payload(encryption_data) as stream:
+        options = resolve_compression(options, stream)
+        if options.compression:
+            payload = compress_stream(stream, options.compression, workers)
+
+    if payload is None:
+        header = set_header(encryption_data, options, legacy_header)
+    else:
+        size = payload.seek(0, SEEK_END)
+        payload.seek(0)
+        size_in_bits = size * 8 + HEADER_SIZE
+        f_type = 1 if is_file(encryption_data) else 0
+        header = build_header(f_type, encryption_data if f_type else '', size, options, legacy_header,
+                              crcs=None if legacy_header else get_chunk_crcs(payload))
+    options = get_header_options(options, header)
+    image = open_image(image_to_encode_in)
+
+    max_bits = get_capacity(image.width, image.height, options)
+    output = get_output_file(file_output)
+    fits = size_in_bits - HEADER_SIZE <= max_bits
+    same_format = Image.registered_extensions().get(splitext(output)[1].lower()) == image.format
+    has_channels = image.mode == 'RGBA' or not options.channels & 0b1000
+
+    # uncompressed carrier saved in its own format is changed right in the copy of the file
+    if fits and same_format and has_channels and map_pixels(image_to_encode_in) is not None:
+        if abspath(output) != abspath(image_to_encode_in):
+            copyfile(image_to_encode_in, output)
+        with open_payload(encryption_data) if payload is None else payload as stream:
+            encode_mapped(output, stream, header, options, workers)
+
+        return (size_in_bits - HEADER_SIZE) // 8
+
+    # PNG carrier is decoded and saved band by band so whole image is never in memory
+    if fits and max_memory and output.lower().endswith('.png') and get_band_info(image_to_encode_in, max_memory):
+        bands = encode_bands(image_to_encode_in, output, load_payload(encryption_data if payload is None else payload),
+                             header, options, max_memory)
+        if details is not None:
+            details['bands'] = bands
+
+        return (size_in_bits - HEADER_SIZE) // 8
+
+    if size_in_bits - HEADER_SIZE > max_bits and not resize:
+        raise CapacityError('The file/text to encode is too big.')
+
+    load_pixels(image, image_to_encode_in)
+    if size_in_bits - HEADER_SIZE > max_bits:
+        new_size = plan_resize(image.width, image.height, size_in_bits - HEADER_SIZE, options)
+        image = resize_image(image, new_size, resample)
+
+    if payload is None:
+        image = encode(encryption_data, image, header, options, workers)
+    else:
+        with payload:
+            image = encode_stream(image, payload, header, options, workers)
+    image.save(output)
+
+    return (size_in_bits - HEADER_SIZE) // 8
+
+
+def encode_wrapper():
+    encryption_data = input('What do you want to encode?\n')
+
+    # check if it is file or string, validate if exists, get size in bits
+    size_in_bits = validate_and_get_size(encryption_data)
+
+    encryption_type = input('What type of encryption to use?\n'
+                            '0. Every pixel,\n'
+                            '1. Every even pixel,\n'
+                            '2. Every odd pixel,\n'
+                            '3. Every pixel row by row,\n'
+                            '4. Every n-th pixel row by row,\n'
+                            '5. Pixels in order given by key,\n')
+
+    if encryption_type == '4':
+        stride = input('Every which pixel to use?\n')
+        offset = input('How many pixels to skip at start?\n')
+        options = Options(4, stride=int(stride), offset=int(offset))
+    elif encryption_type == '5':
+        options = Options(5, key=input('Write key.\n'))
+    else:
+        options = Options(int(encryption_type))
+    header = set_header(encryption_data, options)
+    options = get_header_options(options, header)
+
+    # get image to encode in name
+    image_to_encode_in = input('In what file do you want to encode it?\n')
+
+    # try to open image
+    try:
+        image = Image.open(image_to_encode_in)
+    except FileNotFoundError:
+        print('File in which you want to encode does not exist.\n')
+        exit(2)
+
+    # image max bits to encode in
+    max_bits = get_capacity(image.width, image.height, options)
+
+    file_output = input('What should be the output file name?(without extension)\n')
+
+    # check if image is big enough to encode data in it
+    if size_in_bits - HEADER_SIZE <= max_bits:
+        changed_image = encode(encryption_data, image, header, options)
+    else:
+        print('The file/text to encode is too big. \n')
+        # suggest making image bigger
+        make_bigger = input('Do you want to make image to which you are encoding bigger?\n'
+                            'yes/no\n')
+
+        if make_bigger.__eq__('yes'):
+            new_size = plan_resize(image.width, image.height, size_in_bits - HEADER_SIZE, options)
+            resized_image = resize_image(image, new_size)
+
+            changed_image = encode(encryption_data, resized_image, header, options)
+        else:
+            exit(4)
+
+    # save changed image - must save as png, if saving as jpeg the changed bits does not save !! why?
+    changed_image.save(file_output + '.png')
+
+
+def read_manifest(file_name: str) -> list:
+    """
+    Function that reads manifest of jobs, one CSV row per job,
+    lines starting with # are skipped
+    :param file_name: manifest file name
+    :return: list of rows
+    """
+    with open(file_name, newline='') as f:
+        return [
+            tuple(field.strip() for field in row)
+            for row in csv.reader(f)
+            if row and not row[0].startswith('#')
+        ]
+
+
+def encode_item(row: tuple) -> tuple:
+    """
+    Function that encodes one manifest row without asking anything, errors are returned instead of ending program
+    :param row: (payload, carrier, output without extension[, enc_type, depth, channels, stride, offset, key,
+                compression])
+    :return: tuple (row, error or None, payload size in bytes, seconds)
+    """
+    start = time.perf_counter()
+
+    try:
+        encryption_data, image_to_encode_in, file_output = row[:3]
+        options = Options(
+            int(row[3]) if len(row) > 3 else 0,
+            int(row[4]) if len(row) > 4 else 1,
+            parse_channels(row[5]) if len(row) > 5 else 0b0111,
+            int(row[6]) if len(row) > 6 else 1,
+            int(row[7]) if len(row) > 7 else 0,
+            row[8] or None if len(row) > 8 else None,
+            row[9] if len(row) > 9 else 0,
+        )
+        # every item has its own process already
+        size = encode_to_file(encryption_data, image_to_encode_in, file_output, options, workers=1)
+    except Exception as e:
+        return row, str(e), 0, time.perf_counter() - start
+
+    return row, None, size, time.perf_counter() - start
+
+
+def batch_encode(rows: list, workers: int = None, verbose: bool = True) -> list:
+    """
+    Function that encodes all manifest rows in pool of processes and prints status of every row
+    :param rows: manifest rows
+    :param workers: number of processes, number of CPUs by default
+    :param verbose: print status of every row and summary
+    :return: list of results of encode_item
+    """
+    start = time.perf_counter()
+    results = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(encode_item, rows, chunksize=max(1, len(rows) // 64)):
+            row, error = result[:2]
+            if verbose:
+                print('{}: {} -> {}'.format('failed' if error else 'ok', row[0] if row else '',
+                                            get_output_file(row[2]) if len(row) > 2 else ''),
+                      '({})'.format(error) if error else '')
+            results.append(result)
+
+    elapsed = time.perf_counter() - start
+    done = [result for result in results if result[1] is None]
+    size = sum(result[2] for result in done)
+    if verbose:
+        print('Encoded {} of {} items, {} bytes in {:.2f} s ({:.1f} items/s, {:.2f} MB/s)'.format(
+            len(done), len(results), size, elapsed, len(done) / elapsed, size / elapsed / 1e6
+        ))
+
+    return results
+
+
+def batch_encode_wrapper():
+    manifest = input('Write manifest file name (rows: payload,carrier,output,encryption type).\n')
+    workers = input('How many processes to use? (empty for number of CPUs)\n')
+
+    try:
+        rows = read_manifest(manifest)
+    except FileNotFoundError:
+        print('File does not exist.\n')
+        exit(2)
+
+    results = batch_encode(rows, int(workers) if workers else None)
+
+    if any(result[1] for result in results):
+        exit(1)
+
+
+def get_header(decode_image: Image) -> Header:
+    """
+    Function that returns header from image to decode
+    :param decode_image: image or array of image to decode, only first MAX_HEADER_PIXELS pixels are read
+    :return: Header
+    """
+    pixels = numpy.asarray(decode_image)
+    # encoder always writes rgb(a), grayscale and palette images can not hold data
+    if pixels.ndim != 3 or pixels.shape[2] < 3:
+        raise HeaderError('Image does not hold encoded data.')
+
+    rows = min(pixels.shape[0], MAX_HEADER_PIXELS)
+    cols = math.ceil(MAX_HEADER_PIXELS / rows)
+    header_bits = get_lsb_plane(pixels[:rows, :cols])[:MAX_HEADER_PIXELS].reshape(-1)
+    rows = math.ceil(MAX_HEADER_PIXELS / pixels.shape[1])
+    row_bits = (pixels[:rows, :, :3] & 1).reshape(-1)[:MAX_HEADER_PIXELS * 3]
+
+    # only checked header of row by row types is stored row by row, other match is chance of image bits
+    if is_compact_header(row_bits):
+        try:
+            header = parse_compact_header(row_bits)
+        except HeaderError:
+            header = None
+        if header and header.crc and header.enc_type in ROW_TYPES:
+            return header._replace(options=header.options._replace(row_header=True))
+
+    if is_compact_header(header_bits):
+        return parse_compact_header(header_bits)
+
+    return parse_header(header_bits[:HEADER_SIZE])
+
+
+def is_compact_header(header_bits: numpy.ndarray) -> bool:
+    """
+    Function that checks if header bits start with magic and known version of compact header
+    :param header_bits: array of header bits
+    :return: bool
+    """
+    start = numpy.packbits(header_bits[:24]).tobytes()
+
+    return start[:2] == COMPACT_MAGIC and len(start) == 3 and start[2] >> 6 in (COMPACT_VERSION, COMPACT_SPAN_VERSION,
+                                                                               COMPACT_CHECKED_VERSION)
+
+
+def parse_compact_header(header_bits: numpy.ndarray) -> Header:
+    """
+    Function that returns header fields from compact header bits, enc_start is header length in bits
+    and enc_end is the value old header would store, so the payload size is counted the same way
+    :param header_bits: array of bits starting with compact header
+    :return: Header
+    """
+    data = numpy.packbits(header_bits[:header_bits.size // 8 * 8]).tobytes()
+    f_type, has_name, has_options, enc_type = data[2] >> 5 & 1, data[2] >> 4 & 1, data[2] >> 3 & 1, data[2] & 7
+    version = data[2] >> 6
+    position = 3
+    word = 0
+    layout = {}
+    file_name = ''
+    span = None
+
+    try:
+        has_span = version == COMPACT_SPAN_VERSION
+        has_layout = False
+        if version == COMPACT_CHECKED_VERSION:
+            has_span, has_layout = data[position] & 1, data[position] & LAYOUT_FLAG
+            position += 1
+        if has_span:
+            set_id = struct.unpack_from('>I', data, position)[0]
+            index, position = read_varint(data, position + 4)
+            count, position = read_varint(data, position)
+            span = Span(set_id, index, count)
+        if has_options:
+            word = struct.unpack_from('>I', data, position)[0]
+            position += 4
+        if has_layout:
+            layout['stride'], position = read_varint(data, position)
+            layout['offset'], position = read_varint(data, position)
+            layout['stride'] += 1
+        size, position = read_varint(data, position)
+        if has_name:
+            length, position = read_varint(data, position)
+            file_name = data[position:position + length].decode('utf-8', 'replace')
+            position += length
+        crc_bits = 0
+        if version == COMPACT_CHECKED_VERSION:
+            if struct.unpack_from('>I', data, position)[0] != zlib.crc32(data[:position]):
+                raise HeaderError('Header of image is damaged.')
+            position += 4
+            crc_bits = 32 * get_chunk_count(size)
+    except (IndexError, struct.error):
+        raise HeaderError('Header of image is damaged.')
+
+    if position > len(data):
+        raise HeaderError('Header of image is damaged.')
+
+    options = parse_options(enc_type, word)._replace(header_pixels=math.ceil((position * 8 + crc_bits) / 3),
+                                                     **layout)
+    enc_end = size * 8 * get_size_factor(enc_type) + HEADER_SIZE
+
+    return Header(f_type, enc_type, file_name, position * 8, enc_end, options, span,
+                  version == COMPACT_CHECKED_VERSION)
+
+
+def parse_header(header_bits: numpy.ndarray) -> Header:
+    """
+    Function that returns header fields from old header bits
+    :param header_bits: array of HEADER_SIZE bits
+    :return: Header
+    """
+    f_type = int(header_bits[0])
+    enc_type = get_int_from_bits(header_bits[1:4])
+    # name is padded by zeros from left
+    name = numpy.packbits(header_bits[4:516]).tobytes().lstrip(b'\x00')
+    # always
+    enc_start = HEADER_SIZE
+    enc_end = get_int_from_bits(header_bits[548:580])
+    word = get_int_from_bits(header_bits[516:548])
+    options = parse_options(enc_type, word)
+
+    # old header has no magic, so low bits of image without data are caught by values no encoder writes
+    if (enc_type not in ENC_TYPES or enc_end < HEADER_SIZE or f_type == 0 and name or min(name, default=32) < 32
+            or not (word == HEADER_SIZE + 1 or word & OPTIONS_FLAG and options.channels
+                    and (enc_type == 4 or (options.stride, options.offset) == (1, 0)))):
+        raise HeaderError('Image does not hold encoded data.')
+
+    return Header(f_type, enc_type, name.decode('utf-8', 'replace'), enc_start, enc_end, options)
+
+
+def get_int_from_bits(bits_l: numpy.ndarray) -> int:
+    """
+    Function that return int from bits array (most significant bit first)
+    :param bits_l: array of bits
+    :return: int
+    """
+    # pad from left to whole bytes
+    padded = numpy.concatenate((numpy.zeros(-len(bits_l) % 8, dtype=numpy.uint8), bits_l))
+
+    return int.from_bytes(numpy.packbits(padded).tobytes(), 'big')
+
+
+def read_png_rows(file_name: str, rows: int) -> Image:
+    """
+    Function that decodes only first rows of PNG image, decompression stops
+    as soon as the data of these rows are inflated, other formats are read whole
+    :param file_name: image file name
+    :param rows: number of rows to read
+    :return: Image with at most rows rows
+    """
+    with open(file_name, 'rb') as f:
+        if f.read(8) != PNG_SIGNATURE:
+            image = load_pixels(open_image(file_name), file_name)
+            return image.crop((0, 0, image.width, min(rows, image.height)))
+
+        chunks = []
+        inflate = zlib.decompressobj()
+        raw = b''
+        need = None
+        damaged = 'Image {} is damaged or truncated.'.format(file_name)
+
+        while True:
+            start = f.read(8)
+            length, chunk_type = struct.unpack('>I4s', start) if len(start) == 8 else (0, b'')
+            data = f.read(length)
+            # file cut before the rows or chunks out of order
+            if len(data) < length or f.read(4) == b'' or chunk_type != b'IHDR' and need is None:
+                raise HeaderError(damaged)
+
+            if chunk_type == b'IHDR':
+                if length != 13 or data[9] not in PNG_CHANNELS:
+                    raise HeaderError(damaged)
+                width, height, bit_depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', data)
+                if interlace:
+                    image = load_pixels(open_image(file_name), file_name)
+                    return image.crop((0, 0, image.width, min(rows, image.height)))
+
+                rows = min(rows, height)
+                row_bytes = math.ceil(width * PNG_CHANNELS[color_type] * bit_depth / 8)
+                need = rows * (row_bytes + 1)
+                data = data[:4] + struct.pack('>I', rows) + data[8:]
+            elif chunk_type == b'IDAT':
+                try:
+                    raw += inflate.decompress(data, need - len(raw))
+                except zlib.error:
+                    raise HeaderError(damaged)
+                if len(raw) >= need:
+                    break
+                continue
+            elif chunk_type == b'IEND':
+                raise HeaderError(damaged)
+
+            chunks.append((chunk_type, data))
+
+    # filtered rows are put to new PNG as stored data, so Pillow does the unfiltering
+    chunks.append((b'IDAT', zlib.compress(raw, 0)))
+    chunks.append((b'IEND', b''))
+    png = PNG_SIGNATURE + b''.join(get_png_chunk(chunk_type, data) for chunk_type, data in chunks)
+
+    return Image.open(BytesIO(png))
+
+
+def get_png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """
+    Function that returns PNG chunk with length and CRC
+    :param chunk_type: 4 bytes type of chunk
+    :param data: data of chunk
+    :return: bytes
+    """
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def get_band_info(file_name: str, max_memory: int, options: Options = Options()) -> dict:
+    """
+    Function that returns how PNG image is processed by row bands in given memory, only 8 bit RGB and RGBA
+    images which are not interlaced can be processed so
+    :param file_name: image file name
+    :param max_memory: memory ceiling in bytes
+    :param options: options of encoding, positions of every payload bit in band take memory too
+    :return: dict (width, height, channels, band_rows, bands, max_memory) or None for other images
+    """
+    with open(file_name, 'rb') as f:
+        start = f.read(33)
+
+    if len(start) < 33 or start[:8] != PNG_SIGNATURE or start[12:16] != b'IHDR':
+        return None
+    width, height, bit_depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', start[16:29])
+    if bit_depth != 8 or color_type not in (2, 6) or interlace:
+        return None
+
+    channels = PNG_CHANNELS[color_type]
+    bits_per_pixel = get_channels(options.channels).size * options.depth
+    band_rows = min(max(1, max_memory // (width * (channels * BAND_COST + bits_per_pixel * BAND_BIT_COST))), height)
+
+    return {'width': width, 'height': height, 'channels': channels, 'band_rows': band_rows,
+            'bands': math.ceil(height / band_rows), 'max_memory': max_memory}
+
+
+def read_png_bands(file_name: str, band_rows: int):
+    """
+    Function that decodes PNG image by bands of rows, only one band and one chunk of compressed data are in memory,
+    every band is unfiltered by Pillow with the last row of previous band put before it
+    :param file_name: image file name, see get_band_info
+    :param band_rows: rows in band
+    :return: generator of numpy.ndarray (rows, width, channels)
+    """
+    inflate = zlib.decompressobj()
+    raw = b''
+    rows_left = None
+    damaged = 'Image {} is damaged or truncated.'.format(file_name)
+
+    with open(file_name, 'rb') as f:
+        f.read(8)
+        while True:
+            start = f.read(8)
+            length, chunk_type = struct.unpack('>I4s', start) if len(start) == 8 else (0, b'')
+            data = f.read(length)
+            if len(data) < length or f.read(4) == b'' or chunk_type != b'IHDR' and rows_left is None:
+                raise InvalidInputError(damaged)
+
+            if chunk_type == b'IHDR':
+                width, height = struct.unpack('>II', data[:8])
+                color_type = data[9]
+                row_bytes = width * PNG_CHANNELS[color_type]
+                previous = bytes(row_bytes)
+                rows_left = height
+            elif chunk_type == b'IDAT':
+                while data and rows_left:
+                    rows = min(band_rows, rows_left)
+                    need = rows * (row_bytes + 1)
+                    try:
+                        raw += inflate.decompress(data, need - len(raw))
+                    except zlib.error:
+                        raise InvalidInputError(damaged)
+                    data = inflate.unconsumed_tail
+                    if len(raw) < need:
+                        continue
+
+                    ihdr = struct.pack('>IIBBBBB', width, rows + 1, 8, color_type, 0, 0, 0)
+                    idat = zlib.compress(b'\x00' + previous + raw, 0)
+                    png = PNG_SIGNATURE + get_png_chunk(b'IHDR', ihdr) + get_png_chunk(b'IDAT', idat) \
+                        + get_png_chunk(b'IEND', b'')
+                    band = numpy.array(Image.open(BytesIO(png)))[1:]
+                    # band can be changed by caller, keep its row as it is in file
+                    previous = band[-1].tobytes()
+                    rows_left -= rows
+                    raw = b''
+                    yield band
+            elif chunk_type == b'IEND':
+                raise InvalidInputError(damaged)
+            if rows_left == 0:
+                return
+
+
+def filter_rows(band: numpy.ndarray, previous: numpy.ndarray) -> bytes:
+    """
+    Function that returns rows of band filtered by Paeth filter of PNG, every row starts with filter type
+    :param band: array of pixels (rows, width, channels)
+    :param previous: last row of previous band, zeros for first band
+    :return: bytes
+    """
+    rows, width, channels = band.shape
+    raw = band.reshape(rows, -1).astype(numpy.int16)
+    up = numpy.vstack((previous.reshape(1, -1), raw[:-1]))
+    left = numpy.zeros_like(raw)
+    left[:, channels:] = raw[:, :-channels]
+    up_left = numpy.zeros_like(raw)
+    up_left[:, channels:] = up[:, :-channels]
+
+    estimate = left + up - up_left
+    to_left, to_up, to_up_left = abs(estimate - left), abs(estimate - up), abs(estimate - up_left)
+    predicted = numpy.where((to_left <= to_up) & (to_left <= to_up_left), left,
+                            numpy.where(to_up <= to_up_left, up, up_left))
+    filtered = ((raw - predicted) & 0xFF).astype(numpy.uint8)
+
+    return numpy.hstack((numpy.full((rows, 1), 4, dtype=numpy.uint8), filtered)).tobytes()
+
+
+def write_png_bands(file_name: str, width: int, height: int, channels: int, bands) -> None:
+    """
+    Function that writes PNG image from bands of rows as they come
+    :param file_name: output file name
+    :param width: image width
+    :param height: image height
+    :param channels: 3 for RGB, 4 for RGBA
+    :param bands: iterable of numpy.ndarray (rows, width, channels)
+    :return: None
+    """
+    deflate = zlib.compressobj()
+    previous = numpy.zeros(width * channels, dtype=numpy.int16)
+
+    with open(file_name, 'wb') as f:
+        color_type = 6 if channels == 4 else 2
+        f.write(PNG_SIGNATURE + get_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)))
+
+        for band in bands:
+            data = deflate.compress(filter_rows(band, previous))
+            previous = band[-1].reshape(-1).astype(numpy.int16)
+            if data:
+                f.write(get_png_chunk(b'IDAT', data))
+
+        f.write(get_png_chunk(b'IDAT', deflate.flush()) + get_png_chunk(b'IEND', b''))
+
+
+def get_band_positions(first_row: int, rows: int, n_bits: int, options: Options, height: int, width: int) -> tuple:
+    """
+    Function that returns positions of payload bits which fall in band of rows and their indexes in payload
+    :param first_row: first row of band
+    :param rows: rows in band
+    :param n_bits: number of payload bits
+    :param options: options of encoding
+    :param height: image height
+    :param width: image width
+    :return: tuple (positions in band (pixel index row by row, channel, bit), numpy.ndarray of payload bit indexes)
+    """
+    channels = get_channels(options.channels)
+    bits_per_pixel = channels.size * options.depth
+    local = numpy.arange(rows * width, dtype=numpy.int64)
+    index = get_layout_index(local + first_row * width, options, height, width)
+
+    used = (index >= 0) & (index < -(-n_bits // bits_per_pixel))
+    local, index = local[used], index[used]
+
+    slot = numpy.arange(bits_per_pixel)
+    bit = (index[:, None] * bits_per_pixel + slot).reshape(-1)
+    channel, plane = numpy.divmod(numpy.tile(slot, local.size), options.depth)
+    keep = bit < n_bits
+
+    return (numpy.repeat(local, bits_per_pixel)[keep], channels[channel[keep]], plane[keep]), bit[keep]
+
+
+def get_band_header_positions(first_row: int, rows: int, n_bits: int, height: int, width: int,
+                              row_header: bool = False) -> tuple:
+    """
+    Function that returns positions of header bits which fall in band of rows and their indexes in header
+    :param first_row: first row of band
+    :param rows: rows in band
+    :param n_bits: number of header bits
+    :param height: image height
+    :param width: image width
+    :param row_header: header is stored row by row
+    :return: tuple (positions in band (pixel index row by row, channel, bit), numpy.ndarray of header bit indexes)
+    """
+    pixel, channel, plane = get_header_positions(n_bits, height, width, row_header)
+    inside = numpy.flatnonzero((pixel >= first_row * width) & (pixel < (first_row + rows) * width))
+
+    return (pixel[inside] - first_row * width, channel[inside], plane[inside]), inside
+
+
+def encode_bands(file_name: str, output: str, payload: numpy.ndarray, header, options: Options,
+                 max_memory: int) -> dict:
+    """
+    Function that encodes payload to PNG image by bands of rows, so at most max_memory bytes are used for pixels
+    :param file_name: image file name, see get_band_info
+    :param output: output PNG file name
+    :param payload: array of payload bytes, can be mapped from file
+    :param header: header string or array of bits
+    :param options: options of encoding
+    :param max_memory: memory ceiling in bytes
+    :return: dict from get_band_info
+    """
+    info = get_band_info(file_name, max_memory, options)
+    width, height, band_rows = info['width'], info['height'], info['band_rows']
+    if options.channels & 0b1000 and info['channels'] < 4:
+        raise InvalidInputError('Image has no alpha channel to encode in.')
+
+    header_bits = get_header_bits(header)
+    n_bits = payload.size * 8
+
+    def get_bands():
+        for number, band in enumerate(read_png_bands(file_name, band_rows)):
+            first_row = number * band_rows
+            positions, index = get_band_header_positions(first_row, band.shape[0], header_bits.size, height, width,
+                                                         options.row_header)
+            write_lsb(band, positions, header_bits[index])
+
+            positions, bit = get_band_positions(first_row, band.shape[0], n_bits, options, height, width)
+            write_lsb(band, positions, payload[bit >> 3] >> (7 - (bit & 7)).astype(numpy.uint8) & 1)
+            yield band
+
+    write_png_bands(output, width, height, info['channels'], get_bands())
+
+    return info
+
+
+def decode_bands(file_name: str, header: Header, output, max_memory: int) -> int:
+    """
+    Function that writes payload of PNG image to output, image is read by bands of rows so at most
+    max_memory bytes are used for pixels, payload is collected in temporary file
+    :param file_name: image file name, see get_band_info
+    :param header: header of image
+    :param output: writable binary file-like object
+    :param max_memory: memory ceiling in bytes
+    :return: int number of written bytes
+    """
+    check_whole_payload(header)
+    info = get_band_info(file_name, max_memory, header.options)
+    width, height, band_rows = info['width'], info['height'], info['band_rows']
+    # image could be smaller than header says
+    n_bits = min(get_payload_size(header.enc_type, header.enc_end), get_capacity(width, height, header.options))
+    n_bits = n_bits // 8 * 8
+    crc_bits = 32 * get_chunk_count(get_payload_size(header.enc_type, header.enc_end) // 8) if header.crc else 0
+    crc_table = numpy.zeros(crc_bits, dtype=numpy.uint8)
+
+    with TemporaryFile() as stored:
+        stored.truncate(n_bits // 8)
+        if n_bits:
+            payload = numpy.memmap(stored, dtype=numpy.uint8, mode='r+', shape=(n_bits // 8,))
+            for number, band in enumerate(read_png_bands(file_name, band_rows)):
+                positions, bit = get_band_positions(number * band_rows, band.shape[0], n_bits, header.options,
+                                                    height, width)
+                values = read_lsb(band, positions) << (7 - (bit & 7)).astype(numpy.uint8)
+                numpy.bitwise_or.at(payload, bit >> 3, values)
+
+                positions, index = get_band_header_positions(number * band_rows, band.shape[0],
+                                                             header.enc_start + crc_bits, height, width,
+                                                             header.options.row_header)
+                table = index >= header.enc_start
+                crc_table[index[table] - header.enc_start] = read_lsb(band, tuple(part[table] for part in positions))
+            payload.flush()
+            del payload
+
+        stored.seek(0)
+        chunks = iter(lambda: stored.read(CHUNK_BITS // 8), b'')
+        if header.crc:
+            chunks = check_chunks(chunks, numpy.packbits(crc_table).tobytes())
+        if header.options.compression:
+            chunks = decompress_chunks(chunks, header.options.compression)
+        written = 0
+
+        for chunk in chunks:
+            written += output.write(chunk)
+
+    return written
+
+
+def map_pixels(file_name: str, mode: str = 'r') -> numpy.ndarray:
+    """
+    Function that maps pixels of uncompressed image file (BMP, PPM, TIFF) to array without reading them,
+    rows and channels are put in order of decoded image by views, so changed values go right to the file
+    :param file_name: image file name
+    :param mode: 'r' to read, 'r+' to change file
+    :return: numpy.memmap (height, width, channels) or None when pixels are not stored as plain 8 bit rgb(a)
+    """
+    with open_image(file_name) as image:
+        if len(image.tile) != 1:
+            return None
+        codec, extents, offset, args = image.tile[0]
+        width, height = image.size
+
+    args = (args,) if isinstance(args, str) else args
+    if codec != 'raw' or args[0] not in RAW_MODES or tuple(extents) != (0, 0, width, height):
+        return None
+
+    raw_mode = args[0]
+    channels = RAW_MODES[raw_mode]
+    # rows of BMP are padded and stored from bottom
+    row_bytes = args[1] if len(args) > 1 and args[1] else width * channels
+    orientation = args[2] if len(args) > 2 else 1
+
+    pixels = numpy.memmap(file_name, dtype=numpy.uint8, mode=mode, offset=offset, shape=(height, row_bytes))
+    pixels = pixels[:, :width * channels].reshape(height, width, channels)
+    if orientation < 0:
+        pixels = pixels[::-1]
+    if raw_mode.startswith('BGR'):
+        pixels = pixels[:, :, 2::-1]
+
+    return pixels
+
+
+def read_header(file_name: str) -> Header:
+    """
+    Function that returns header of image file without decoding the whole image
+    :param file_name: image file name
+    :return: Header
+    """
+    pixels = map_pixels(file_name)
+    if pixels is not None:
+        return get_header(pixels)
+
+    return get_header(read_png_rows(file_name, MAX_HEADER_PIXELS))
+
+
+def get_lsb_plane(pixels: numpy.ndarray) -> numpy.ndarray:
+    """
+    Function that returns LSB of r, g and b for every pixel, pixels go column by column
+    :param pixels: array of image (height, width, channels)
+    :return: numpy.ndarray (pixels, 3)
+    """
+    return (pixels[:, :, :3] & 1).transpose(1, 0, 2).reshape(-1, 3)
+
+
+def get_payload_size(enc_type: int, enc_end: int) -> int:
+    """
+    Function that returns number of payload bits from header end value
+    :param enc_type: encoding type
+    :param enc_end: end of encoding stored in header
+    :return: int size in bits
+    """
+    # last bit of enc_end is never stored, so round down to whole bytes
+    return max(enc_end - HEADER_SIZE, 0) // (8 * get_size_factor(enc_type)) * 8
+
+
+def get_payload_rows(header: Header, height: int, width: int) -> int:
+    """
+    Function that returns how many rows from top of image hold the payload
+    :param header: header of image
+    :param height: image height
+    :param width: image width
+    :return: int number of rows
+    """
+    first, stride, row_major = get_layout(header.options, height, width)
+
+    # column by column types spread over all rows
+    if not row_major:
+        return height
+
+    bits_per_pixel = get_channels(header.options.channels).size * header.options.depth
+    pixels = math.ceil(get_payload_size(header.enc_type, header.enc_end) / bits_per_pixel)
+    last_pixel = first + stride * (pixels - 1)
+
+    return min(last_pixel // width + 1, height)
+
+
+def read_payload(decode_image: Image, header: Header, size: tuple = None, workers: int = None):
+    """
+    Function that reads stored payload from image by chunks in pool of threads,
+    reads exactly what encode_array wrote
+    :param decode_image: image or array of image to decode
+    :param header: header of image
+    :param size: (width, height) of whole image when decode_image holds only its first rows
+    :param workers: number of threads, number of CPUs by default
+    :return: generator of bytes
+    """
+    pixels = numpy.asarray(decode_image)
+    width, height = size or (pixels.shape[1], pixels.shape[0])
+    n_bits = get_payload_size(header.enc_type, header.enc_end)
+    chunk_bits = get_chunk_bits(header.options, workers)
+
+    def read_chunk(start: int) -> numpy.ndarray:
+        positions = get_payload_positions(start, min(chunk_bits, n_bits - start), header.options, height, width)
+        return read_lsb(pixels, positions)
+
+    for bits in map_threads(read_chunk, range(0, n_bits, chunk_bits), workers):
+        yield numpy.packbits(bits[:bits.size // 8 * 8]).tobytes()
+
+        # end of image
+        if bits.size < chunk_bits:
+            break
+
+
+def decode_to(decode_image: Image, header: Header, output, size: tuple = None, workers: int = None) -> int:
+    """
+    Function that writes payload from image to output, compressed payload is decompressed as it is read
+    :param decode_image: image to decode
+    :param header: header of image
+    :param output: writable binary file-like object
+    :param size: (width, height) of whole image when decode_image holds only its first rows
+    :param workers: number of threads, number of CPUs by default
+    :return: int number of written bytes
+    """
+    check_whole_payload(header)
+    # image is converted once, payload and CRC table are read from the same array
+    pixels = numpy.asarray(decode_image)
+    chunks = read_payload(pixels, header, size, workers)
+    if header.crc:
+        chunks = check_chunks(chunks, read_chunk_crcs(pixels, header, size))
+    if header.options.compression:
+        chunks = decompress_chunks(chunks, header.options.compression)
+    written = 0
+
+    for chunk in chunks:
+        written += output.write(chunk)
+
+    return written
+
+
+def read_chunk_crcs(decode_image: Image, header: Header, size: tuple = None) -> bytes:
+    """
+    Function that reads CRC table of payload chunks stored after header
+    :param decode_image: image or array of image to decode
+    :param header: header of image with crc set
+    :param size: (width, height) of whole image when decode_image holds only its first rows
+    :return: bytes
+    """
+    pixels = numpy.asarray(decode_image)
+    width, height = size or (pixels.shape[1], pixels.shape[0])
+    n_bits = header.enc_start + 32 * get_chunk_count(get_payload_size(header.enc_type, header.enc_end) // 8)
+    positions = get_header_positions(n_bits, height, width, header.options.row_header)
+
+    return numpy.packbits(read_lsb(pixels, tuple(part[header.enc_start:] for part in positions))).tobytes()
 
 
-def change_bit(bit: int, val: int) -> int:
+def verify_payload(file_name: str, key: str = None, workers: int = None) -> dict:
     """
-    Function that changes last bit in r,g or b value
-    :param bit: int to be encoded
-    :param val: int value of r,g or b
-    :return: edited value of r,g or b
+    Function that checks every chunk of payload by its CRC, chunks are read on their own in pool of threads,
+    so damaged chunks are found without decoding the payload
+    :param file_name: image file name
+    :param key: key of pixel order for type 5
+    :param workers: number of threads, number of CPUs by default
+    :return: dict (chunks, damaged) with numbers of damaged chunks from 1
     """
-    return val & ~1 if bit == 0 else val | 1
+    try:
+        image, header, size = open_for_decode(file_name, key)
+    except FileNotFoundError:
+        raise InvalidInputError('File does not exist.')
+    if not header.crc:
+        raise InvalidInputError('Image has no CRC of payload, it was encoded by older version.')
+
+    pixels = numpy.asarray(image)
+    crcs = read_chunk_crcs(pixels, header, size)
+    expected = struct.unpack('>{}I'.format(len(crcs) // 4), crcs)
+    n_bytes = get_payload_size(header.enc_type, header.enc_end) // 8
+
+    def check(number: int) -> bool:
+        n_bits = min(CRC_CHUNK, n_bytes - number * CRC_CHUNK) * 8
+        bits = read_lsb(pixels, get_payload_positions(number * CRC_CHUNK * 8, n_bits, header.options, size[1], size[0]))
+        return bits.size == n_bits and zlib.crc32(numpy.packbits(bits).tobytes()) == expected[number]
+
+    results = map_threads(check, range(len(expected)), workers)
+
+    return {'chunks': len(expected), 'damaged': [number + 1 for number, ok in enumerate(results) if not ok]}
 
 
-def encode_loop(input_image: Image, bits_data: list, header_l: list, enc_type: int) -> Image:
+def check_key(header: Header) -> None:
     """
-    Function that loops through every pixel of image and puts new bits to LSB
-    :param header_l:
-    :param input_image: input_image in which the data are encoded
-    :param bits_data: data of bits (either string of bits or array of bits)
-    :return: Image
+    Function that raises error when key of pixel order is needed and missing
+    :param header: header of image with key set by set_key
+    :return: None
     """
+    if header.enc_type == 5 and not header.options.key:
+        raise InvalidInputError('Key is needed for encryption type 5.')
 
-    next_bit = None
-    header_l.extend(bits_data)
-    data = iter(header_l)
-    counter = 0
-    counter_bits = 0
-
-    for x in range(input_image.width):
-        for y in range(input_image.height):
-            if enc_type == 0 \
-                    or (enc_type == 1 and counter % 2 == 0) \
-                    or counter_bits < HEADER_SIZE:
-                pixels = list(input_image.getpixel((x, y)))
-
-                next_bit = next(data, None)
-                if next_bit is not None:
-                    # change r
-                    pixels[0] = change_bit(int(next_bit), pixels[0])
-                    counter_bits += 1
-                else:
-                    input_image.putpixel((x, y), tuple(pixels))
-                    break
 
-                if counter_bits == HEADER_SIZE:
-                    counter_bits += 1
-                    counter += 1
-                    continue
-
-                next_bit = next(data, None)
-                if next_bit is not None:
-                    # change g
-                    pixels[1] = change_bit(int(next_bit), pixels[1])
-                    counter_bits += 1
-                else:
-                    input_image.putpixel((x, y), tuple(pixels))
-                    break
+def check_whole_payload(header: Header) -> None:
+    """
+    Function that raises error when payload of image can not be decoded on its own, image holds only
+    one segment of spanned payload or key is missing, it is called before any output is opened
+    :param header: header of image with key set by set_key
+    :return: None
+    """
+    if header.span is not None:
+        raise InvalidInputError('Image holds segment {} of {} of spanned payload, decode all of them together.'.format(
+            header.span.index + 1, header.span.count))
+    check_key(header)
 
-                if counter_bits == HEADER_SIZE:
-                    counter_bits += 1
-                    counter += 1
-                    continue
-
-                next_bit = next(data, None)
-                if next_bit is not None:
-                    # change b
-                    pixels[2] = change_bit(int(next_bit), pixels[2])
-                    counter_bits += 1
-                else:
-                    input_image.putpixel((x, y), tuple(pixels))
-                    break
 
-                input_image.putpixel((x, y), tuple(pixels))
-            counter += 1
+def write_output(file_name: str, write, force: bool = False):
+    """
+    Function that writes output file through temporary file in the same directory, the temporary file
+    replaces output only when write succeeds, so failed decoding never leaves broken or lost file
+    :param file_name: output file name
+    :param write: function which writes to binary file object and returns result
+    :param force: overwrite existing file
+    :return: result of write
+    """
+    if exists(file_name) and not force:
+        raise InvalidInputError('File {} already exists, use --force to overwrite it.'.format(file_name))
 
-        if next_bit is None:
-            break
+    try:
+        output_file = NamedTemporaryFile(dir=dirname(file_name) or '.', prefix='.' + basename(file_name) + '.',
+                                         delete=False)
+    except OSError:
+        raise InvalidInputError('File {} can not be written.'.format(file_name))
 
-    return input_image
+    try:
+        with output_file:
+            result = write(output_file)
+        # temporary file is created private, output gets usual permissions of new file
+        umask(mask := umask(0))
+        chmod(output_file.name, 0o666 & ~mask)
+        replace(output_file.name, file_name)
+    except BaseException:
+        remove(output_file.name)
+        raise
+
+    return result
 
 
-def encode(user_input: str, image: Image, header: str, enc_type: int) -> Image:
+def decode_file(decode_image: Image, header: Header, file_name: str, size: tuple = None,
+                workers: int = None, force: bool = False) -> int:
     """
-    Function to encode
-    :param user_input: user input string
-    :param image: Image
-    :param header:
-    :param: enc_type
-    :return: Image
+    Function that writes payload from image to file, the file is allocated to the stored size from header first,
+    the file is left out when payload is damaged
+    :param decode_image: image to decode
+    :param header: header of image
+    :param file_name: output file name, see write_output
+    :param size: (width, height) of whole image when decode_image holds only its first rows
+    :param workers: number of threads, number of CPUs by default
+    :param force: overwrite existing file
+    :return: int number of written bytes
     """
-    if is_file(user_input):
-        # can do this as in this point I know it exist
-        f_bytes = numpy.fromfile(user_input, dtype="uint8")
-        f_bits = numpy.unpackbits(f_bytes)
+    check_whole_payload(header)
+    n_bits = get_payload_size(header.enc_type, header.enc_end)
+    if size is not None:
+        # damaged or forged header must not allocate more than image can hold
+        n_bits = min(n_bits, get_capacity(*size, header.options))
 
-        return encode_loop(image, list(f_bits), list(header), enc_type)
-    else:
-        return encode_loop(image, list(convert_text_to_bits(user_input)), list(header), enc_type)
+    def write(output_file) -> int:
+        output_file.truncate(n_bits // 8)
+        written = decode_to(decode_image, header, output_file, size, workers)
+        # image could be smaller than header says
+        output_file.truncate(written)
+        return written
 
+    return write_output(file_name, write, force)
 
-def convert_text_to_bits(text: str) -> str:
+
+def bytes_to_text(payload: bytes) -> str:
     """
-    Converts text to string of bits
-    :param text: text to be converted
-    :return: converted string
+    Function that decodes text payload
+    :param payload: decoded bytes
+    :return: str
     """
-    return str(''.join(format(ord(i), '08b') for i in text))
+    try:
+        return payload.decode('utf-8')
+    except UnicodeDecodeError:
+        # older images stored every character as single byte
+        return payload.decode('latin-1')
 
 
-def set_header(u_input: str, enc_type: int) -> str:
+def set_key(header: Header, key: str) -> Header:
     """
-    Function that sets header info
-    :param u_input:
-    :param enc_type:
-    :return: str
+    Function that returns header with key of pixel order, key is not stored in image
+    :param header: header of image
+    :param key: user key, None to keep header as it is
+    :return: Header
     """
-    if is_file(u_input):
-        file_type = '1'  # file
-        file_stats = stat(u_input)
-        # get file size in bits
-        size_bits = file_stats.st_size * 8 + HEADER_SIZE if enc_type == 0 else file_stats.st_size * 8 * 2 + HEADER_SIZE
+    if key is None:
+        return header
+
+    return header._replace(options=header.options._replace(key=key))
+
+
+def open_for_decode(file_name: str, key: str = None) -> tuple:
+    """
+    Function that reads header and then only the rows of image which hold the payload
+    :param file_name: image file name
+    :param key: key of pixel order for type 5
+    :return: tuple (image or array mapped from uncompressed file, header, (width, height) of whole image)
+    """
+    pixels = map_pixels(file_name)
+    if pixels is not None:
+        return pixels, set_key(get_header(pixels), key), (pixels.shape[1], pixels.shape[0])
+
+    image = open_image(file_name)
+    size = image.size
+    header = set_key(read_header(file_name), key)
+
+    # row by row payload does not need rows under its end
+    rows = get_payload_rows(header, image.height, image.width)
+    if rows < image.height:
+        image = read_png_rows(file_name, rows)
     else:
-        file_type = '0'  # text
-        size_bits = len(u_input) * 8 + HEADER_SIZE if enc_type == 0 else len(u_input) * 8 * 2 + HEADER_SIZE
+        load_pixels(image, file_name)
+
+    return image, header, size
+
+
+def decode_wrapper():
+    user_input = input('What image do you want to decode?\n')
+
+    # try to open image
+    try:
+        image, header, size = open_for_decode(user_input)
+    except FileNotFoundError:
+        print('File does not exist.\n')
+        exit(2)
+    file_name_split = header[2].split('.')
+
+    if header[1] == 5:
+        header = set_key(header, input('Write key.\n'))
 
-    # max length of file name to store
-    if len(u_input) > 64:
-        print('File name to store is too long. \n')
+    if header[0] == 0:
+        payload = BytesIO()
+        decode_to(image, header, payload, size)
+        print('Encoded text is: ', format(bytes_to_text(payload.getvalue())))
         exit(2)
     else:
-        if is_file(u_input):
-            file_name = convert_text_to_bits(u_input)
-        else:
-            file_name = '0'
+        decode_file(image, header, 'test-out.' + file_name_split[1], size, force=True)
 
-        k = 512 - len(file_name)
-        file_name = file_name.rjust(k + len(file_name), '0')
 
-    enc_start = str(bin(HEADER_SIZE + 1)).replace('b', '')
-    k = 32 - len(enc_start)
-    enc_start = enc_start.rjust(k + len(enc_start), '0')
-    enc_end = str(bin(size_bits)).replace('b', '')
-    k = 32 - len(enc_end)
+def find_images(path: str) -> tuple:
+    """
+    Function that returns images to decode, path is directory to walk through or file with list of images
+    :param path: directory or file with one image name per line
+    :return: tuple (root directory, list of image names)
+    """
+    if isdir(path):
+        images = [
+            join(directory, name)
+            for directory, _, names in walk(path)
+            for name in sorted(names)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+        return path, images
 
-    if len(enc_end) > 32:
-        print('Program does not allow this big encryption.\n')
-        exit(42)
+    with open(path) as f:
+        images = [line.strip() for line in f if line.strip()]
+
+    return commonpath([dirname(abspath(image)) for image in images]) if images else '.', images
 
-    enc_end = enc_end.rjust(k + len(enc_end), '0')
 
-    enc_type = str(bin(enc_type)).replace('b', '')
-    k = 3 - len(enc_type)
-    enc_type = enc_type.rjust(k + len(enc_type), '0')
+def get_output_name(image_name: str, root: str, output_dir: str, header: tuple) -> str:
+    """
+    Function that returns output file name for payload of image, the image directory
+    structure is kept under output directory so outputs do not overwrite each other
+    :param image_name: image file name
+    :param root: directory images are searched in
+    :param output_dir: directory for outputs
+    :param header: header of image
+    :return: str
+    """
+    stem = splitext(relpath(abspath(image_name), abspath(root)))[0]
+    # do not let stored name go out of output directory
+    stored_name = (basename(header[2]) or 'payload') if header[0] == 1 else 'text.txt'
 
-    return file_type + enc_type + file_name + enc_start + enc_end
+    return join(output_dir, stem + '-' + stored_name)
 
 
-def is_image_big_enough(file_size: int, image_size: int, enc_type: int) -> bool:
+def decode_item(image_name: str, root: str, output_dir: str, key: str = None, force: bool = False) -> tuple:
     """
-    Function that checks if file/text size is bigger than image available size
-    :param file_size:
-    :param image_size:
-    :param enc_type:
-    :return: bool
+    Function that decodes payload of one image to its own output file, errors are returned instead of ending program
+    :param image_name: image file name
+    :param root: directory images are searched in
+    :param output_dir: directory for outputs
+    :param key: key of pixel order for type 5
+    :param force: overwrite existing output file
+    :return: tuple (image name, error or None, output file name, payload size in bytes, seconds)
     """
-    return file_size < image_size if enc_type == 0 else file_size * 2 < image_size
+    start = time.perf_counter()
 
+    try:
+        image, header, size = open_for_decode(image_name, key)
+        output_name = get_output_name(image_name, root, output_dir, header)
+        makedirs(dirname(output_name) or '.', exist_ok=True)
+        # every item has its own process already
+        written = decode_file(image, header, output_name, size, 1, force)
+    except Exception as e:
+        return image_name, str(e), None, 0, time.perf_counter() - start
 
-def validate_and_get_size(u_input: str) -> int:
+    return image_name, None, output_name, written, time.perf_counter() - start
+
+
+def batch_decode(path: str, output_dir: str, workers: int = None, verbose: bool = True, key: str = None,
+                 force: bool = False) -> list:
     """
-    File that validates user input and returns it size in bits
-    :param u_input: user input
-    :return: int size in bits
+    Function that decodes all images in pool of processes and prints status of every image
+    :param path: directory or file with one image name per line
+    :param output_dir: directory for outputs
+    :param workers: number of processes, number of CPUs by default
+    :param verbose: print status of every image and summary
+    :param key: key of pixel order for images of type 5
+    :param force: overwrite existing output files
+    :return: list of results of decode_item
     """
-    size = 0
-    # if it is file (not checking png for now)
-    if '.jpg' in u_input or '.jpeg' in u_input or '.txt' in u_input:
-        if exists(u_input):
-            file_stats = stat(u_input)
-            # get file size in bits
-            size = file_stats.st_size * 8 + HEADER_SIZE
-        else:
-            print('File which you want to encode does not exist.\n')
-            exit(2)
-    else:
-        # get text input size in bits
-        size = len(u_input) * 8 + HEADER_SIZE
+    start = time.perf_counter()
+    root, images = find_images(path)
+    results = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(decode_item, images, repeat(root), repeat(output_dir), repeat(key), repeat(force),
+                                   chunksize=max(1, len(images) // 64)):
+            image_name, error, output_name = result[:3]
+            if verbose:
+                print('{}: {} -> {}'.format('failed' if error else 'ok', image_name, output_name),
+                      '({})'.format(error) if error else '')
+            results.append(result)
+
+    elapsed = time.perf_counter() - start
+    done = [result for result in results if result[1] is None]
+    size = sum(result[3] for result in done)
+    if verbose:
+        print('Decoded {} of {} images, {} bytes in {:.2f} s ({:.1f} images/s, {:.2f} MB/s)'.format(
+            len(done), len(results), size, elapsed, len(done) / elapsed, size / elapsed / 1e6
+        ))
+
+    return results
+
+
+def plan_span(carriers: list, size: int, f_type: int, file_name: str, options: Options) -> list:
+    """
+    Function that splits payload over carriers in given order, every carrier gets as much as it holds,
+    only image sizes are read
+    :param carriers: image file names
+    :param size: payload size in bytes
+    :param f_type: 0 for text, 1 for file
+    :param file_name: file name to store, empty for text
+    :param options: options of encoding
+    :return: list of tuples (carrier, segment start, segment length in bytes), only carriers which are needed
+    """
+    # header with the biggest values is the longest, so every segment fits with its real header
+    header = build_header(f_type, file_name, size, options, span=Span((1 << 32) - 1, len(carriers) - 1, len(carriers)))
+    options = get_header_options(options, header)
+    segments = []
+    start = 0
+
+    for carrier in carriers:
+        if start == size:
+            break
+        width, height, alpha = get_image_size(carrier)
+        if options.channels & 0b1000 and not alpha:
+            raise InvalidInputError('Image {} has no alpha channel to encode in.'.format(carrier))
+        length = min(size - start, get_capacity(width, height, options) // 8)
+        if length:
+            segments.append((carrier, start, length))
+            start += length
 
-    return size
+    if start < size:
+        raise CapacityError('The file/text to encode is too big.')
+
+    return segments
 
 
-def resize_image(init_image: Image, resize_r: float) -> Image:
+def encode_span(encryption_data: str, carriers: list, file_output: str, options: Options, set_id: int = None,
+                workers: int = None) -> list:
     """
-    Function that resizes image
-    :param init_image: image to encode in
-    :param resize_r: resize ration
-    :return: Image
+    Function that spreads text or file over carriers, every carrier gets one segment with header of set ID,
+    index and count, carriers are encoded in pool of threads and saved as PNG
+    :param encryption_data: name of existing file to encode, anything else is encoded as text
+    :param carriers: image file names, used in given order
+    :param file_output: output file name without extension, number of segment is added to it
+    :param options: options of encoding
+    :param set_id: number shared by all segments, random by default
+    :param workers: number of threads, number of CPUs by default
+    :return: list of tuples (output file name, segment length in bytes)
     """
-    return init_image.resize(
-        (math.ceil(init_image.width * resize_r), math.ceil(init_image.height * resize_r)),
-        Image.ANTIALIAS
-    )
+    validate_and_get_size(encryption_data)
+    f_type = 1 if is_file(encryption_data) else 0
+    file_name = encryption_data if f_type else ''
+    payload = encryption_data
 
+    with open_payload(encryption_data) as stream:
+        options = resolve_compression(options, stream)
+        if options.compression:
+            payload = compress_stream(stream, options.compression, workers)
+    payload = load_payload(payload)
 
-def encode_wrapper():
-    encryption_data = input('What do you want to encode?\n')
+    segments = plan_span(carriers, payload.size, f_type, file_name, options)
+    set_id = int.from_bytes(urandom(4), 'big') if set_id is None else set_id
 
-    # check if it is file or string, validate if exists, get size in bits
-    size_in_bits = validate_and_get_size(encryption_data)
+    def encode_segment(item: tuple) -> tuple:
+        index, (carrier, start, length) = item
+        image = load_pixels(open_image(carrier), carrier)
+        stream = BytesIO(payload[start:start + length])
+        header = build_header(f_type, file_name, length, options, span=Span(set_id, index, len(segments)),
+                              crcs=get_chunk_crcs(stream))
+        image = encode_stream(image, stream, header, get_header_options(options, header), 1)
+        output = get_output_file('{}-{}'.format(file_output, index + 1))
+        image.save(output)
 
-    encryption_type = input('What type of encryption to use?\n'
-                            '0. Every pixel,\n'
-                            '1. Every even pixel,\n')
+        return output, length
 
-    header = set_header(encryption_data, int(encryption_type))
+    return list(map_threads(encode_segment, enumerate(segments), workers))
 
-    # get image to encode in name
-    image_to_encode_in = input('In what file do you want to encode it?\n')
 
-    # try to open image
+def decode_span(images: list, output, key: str = None, workers: int = None) -> dict:
+    """
+    Function that joins payload spanned over images given in any order and writes it to output,
+    headers are read in pool of threads, then segments are read in their order by chunks in pool of threads
+    :param images: image file names, every segment at least once
+    :param output: writable binary file-like object
+    :param key: key of pixel order for type 5
+    :param workers: number of threads, number of CPUs by default
+    :return: dict metadata from header of first segment with size of written payload
+    """
+    return write_segments(read_segments(images, key, workers), output, workers)
+
+
+def read_segments(images: list, key: str = None, workers: int = None) -> dict:
+    """
+    Function that reads headers of images in pool of threads and checks that they hold all segments
+    of one payload with the same count and compression, so nothing is written for incomplete set
+    :param images: image file names, every segment at least once
+    :param key: key of pixel order for type 5
+    :param workers: number of threads, number of CPUs by default
+    :return: dict {segment index: (image name, header with key)}
+    """
     try:
-        image = Image.open(image_to_encode_in)
+        headers = list(map_threads(read_header, images, workers))
     except FileNotFoundError:
-        print('File in which you want to encode does not exist.\n')
+        raise InvalidInputError('File does not exist.')
+    segments = {}
+
+    for image_name, header in zip(images, headers):
+        if header.span is None:
+            raise InvalidInputError('Image {} does not hold segment of spanned payload.'.format(image_name))
+        if header.span.set_id != headers[0].span.set_id:
+            raise InvalidInputError('Images hold segments of different payloads.')
+        if header.span.count != headers[0].span.count or header.span.index >= header.span.count \
+                or header.options.compression != headers[0].options.compression:
+            raise InvalidInputError('Header of segment in image {} does not match the others.'.format(image_name))
+        header = set_key(header, key)
+        check_key(header)
+        segments.setdefault(header.span.index, (image_name, header))
+
+    count = headers[0].span.count
+    missing = [index + 1 for index in range(count) if index not in segments]
+    if missing:
+        raise InvalidInputError('Segments {} of {} are missing.'.format(', '.join(map(str, missing)), count))
+
+    return segments
+
+
+def write_segments(segments: dict, output, workers: int = None) -> dict:
+    """
+    Function that reads segments one by one in their order and writes their chunks to output as they come,
+    chunks of one segment are read in pool of threads, so only one image and a few chunks are in memory
+    :param segments: dict from read_segments
+    :param output: writable binary file-like object
+    :param workers: number of threads, number of CPUs by default
+    :return: dict metadata from header of first segment with size of written payload
+    """
+    def read_segment(index: int):
+        image_name, header = segments[index]
+        image, _, size = open_for_decode(image_name, header.options.key)
+        pixels = numpy.asarray(image)
+        chunks = read_payload(pixels, header, size, workers)
+        if header.crc:
+            chunks = check_chunks(chunks, read_chunk_crcs(pixels, header, size))
+        yield from chunks
+
+    chunks = (chunk for index in range(len(segments)) for chunk in read_segment(index))
+    header = segments[0][1]
+    if header.options.compression:
+        chunks = decompress_chunks(chunks, header.options.compression)
+    metadata = get_metadata(header)
+    metadata['size'] = 0
+
+    for chunk in chunks:
+        metadata['size'] += output.write(chunk)
+
+    return metadata
+
+
+def batch_decode_wrapper():
+    path = input('Write directory or file with list of images to decode.\n')
+    output_dir = input('Write output directory.\n')
+    workers = input('How many processes to use? (empty for number of CPUs)\n')
+
+    try:
+        results = batch_decode(path, output_dir, int(workers) if workers else None)
+    except FileNotFoundError:
+        print('File does not exist.\n')
         exit(2)
 
-    # image max bits to encode in
-    max_bits = image.width * image.height * 3
+    if any(result[1] for result in results):
+        exit(1)
 
-    file_output = input('What should be the output file name?(without extension)\n')
 
-    # check if image is big enough to encode data in it
-    if is_image_big_enough(size_in_bits, max_bits, int(encryption_type)):
-        changed_image = encode(encryption_data, image, header, int(encryption_type))
-    else:
-        print('The file/text to encode is too big. \n')
-        # suggest making image bigger
-        make_bigger = input('Do you want to make image to which you are encoding bigger?\n'
-                            'yes/no\n')
+def info_wrapper():
+    user_input = input('Write image name to show header of.\n')
 
-        if make_bigger.__eq__('yes'):
-            resize_ratio = size_in_bits / max_bits / 2
-            resized_image = resize_image(image, resize_ratio)
+    # only the header rows are decoded
+    try:
+        header = read_header(user_input)
+    except FileNotFoundError:
+        print('File does not exist.\n')
+        exit(2)
 
-            changed_image = encode(encryption_data, resized_image, header, int(encryption_type))
-        else:
-            exit(4)
+    print('Type: ', 'file' if header[0] == 1 else 'text')
+    print('Encryption type: ', header[1])
+    print('Depth: ', header.options.depth)
+    print('Channels: ', get_channel_names(header.options.channels))
+    if header[1] == 4:
+        print('Stride: ', header.options.stride)
+        print('Offset: ', header.options.offset)
+    print('Compression: ', COMPRESSIONS[header.options.compression])
+    print('File name: ', header[2])
+    print('Size in bytes: ', get_payload_size(header[1], header[4]) // 8)
 
-    # save changed image - must save as png, if saving as jpeg the changed bits does not save !! why?
-    changed_image.save(file_output + '.png')
+
+def chi_square_sf(statistic: float, dof: int) -> float:
+    """
+    Function that returns probability that chi-square value with given degrees of freedom is at least statistic,
+    regularized upper incomplete gamma function by series or continued fraction
+    :param statistic: chi-square value
+    :param dof: degrees of freedom
+    :return: float
+    """
+    a, x = dof / 2, statistic / 2
+    if x <= 0:
+        return 1.0
+    scale = math.exp(-x + a * math.log(x) - math.lgamma(a))
+
+    if x < a + 1:
+        term = total = 1 / a
+        n = a
+        while abs(term) > abs(total) * 1e-12:
+            n += 1
+            term *= x / n
+            total += term
+        return max(1 - total * scale, 0.0)
+
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    fraction = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = 1 / (d if abs(d) > tiny else tiny)
+        c = b + an / c
+        c = c if abs(c) > tiny else tiny
+        fraction *= d * c
+        if abs(d * c - 1) < 1e-12:
+            break
+
+    return scale * fraction
 
 
-def get_header(decode_image: Image):
+def detect_lsb(image, points: int = 100, channels: int = 0b0111) -> dict:
     """
-    Function that returns header from image to decode
-    :param decode_image:
-    :return: tuple
-    """
-    header_l = []
-    counter = 0
-
-    for x in range(decode_image.width):
-        for y in range(decode_image.height):
-            pixels = list(decode_image.getpixel((x, y)))
-            if counter < HEADER_SIZE:
-                header_l.append(pixels[0] & 1)
-                counter += 1
-            else:
-                break
+    Function that runs chi-square attack on pairs of values over growing parts of image taken column by column,
+    the way the payload is put in, low bits full of data make values 2i and 2i + 1 equally frequent,
+    so probability stays near 1 over the part with data
+    :param image: Image, array, file name, bytes or binary file-like object of image
+    :param points: number of parts of image the probability is counted for
+    :param channels: channels to check, bit 0 is R, bit 1 G, bit 2 B and bit 3 A
+    :return: dict (probability for whole image, fraction of image with probability over 0.5 from start,
+             curve of [fraction of image, probability])
+    """
+    # pixels are only read, so uncompressed file is mapped and RGB array is not copied
+    pixels = map_pixels(image) if isinstance(image, (str, PathLike)) else None
+    if pixels is None and isinstance(image, numpy.ndarray) and image.ndim == 3 and image.shape[2] in (3, 4):
+        pixels = image
+    if pixels is None:
+        image = load_image(image)
+        pixels = numpy.asarray(image if image.mode in ('RGB', 'RGBA') else
+                               image.convert('RGBA' if has_alpha(image) else 'RGB'))
+    if channels & 0b1000 and pixels.shape[2] < 4:
+        raise InvalidInputError('Image has no alpha channel to check.')
+    height, width = pixels.shape[:2]
+    points = max(1, min(points, height * width))
+    selected = get_channels(channels)
+
+    def count(block: numpy.ndarray) -> numpy.ndarray:
+        if selected.size == pixels.shape[2]:
+            return numpy.bincount(block.reshape(-1), minlength=256)
+        return sum(numpy.bincount(block[..., channel].reshape(-1), minlength=256) for channel in selected)
+
+    # order of values in part does not matter, so whole columns are counted in place and only the column
+    # where part ends is split
+    histograms = numpy.zeros((points, 256), dtype=numpy.int64)
+    counted = numpy.zeros(256, dtype=numpy.int64)
+    column = 0
+    for number in range(points):
+        end_column, end_row = divmod((number + 1) * height * width // points, height)
+        if end_column > column:
+            counted += count(pixels[:, column:end_column])
+            column = end_column
+        histograms[number] = counted + count(pixels[:end_row, column]) if end_row else counted
+
+    even, odd = histograms[:, 0::2], histograms[:, 1::2]
+    expected = (even + odd) / 2
+    used = expected > POV_MIN_EXPECTED
+    statistic = numpy.where(used, (even - expected) ** 2 / numpy.where(used, expected, 1), 0).sum(axis=1)
+    dof = used.sum(axis=1) - 1
+
+    curve = [[(number + 1) / points, chi_square_sf(float(statistic[number]), int(dof[number]))
+              if dof[number] > 0 else 0.0] for number in range(points)]
+    embedded = next((number for number, (_, probability) in enumerate(curve) if probability <= 0.5), points)
+
+    return {'probability': curve[-1][1], 'embedded': embedded / points, 'curve': curve}
 
-            if counter < HEADER_SIZE:
-                header_l.append(pixels[1] & 1)
-                counter += 1
-            else:
-                break
 
-            if counter < HEADER_SIZE:
-                header_l.append(pixels[2] & 1)
-                counter += 1
-            else:
-                break
+def detect_wrapper():
+    user_input = input('Write image name to detect steganography in.\n')
 
-        if counter >= HEADER_SIZE:
-            break
+    # try to open image
+    try:
+        result = detect_lsb(user_input, 10)
+    except InvalidInputError as e:
+        print(e)
+        exit(2)
+
+    print('Probability of data in whole image: {:.3f}'.format(result['probability']))
+    print('Data are probably in first {:.0%} of image.'.format(result['embedded']))
+    for fraction, probability in result['curve']:
+        print('{:4.0%}: {:.3f}'.format(fraction, probability))
 
-    f_type = header_l[0]
-    enc_type = get_int_from_bits(header_l[1:4])
-    file_name = get_string_from_bits_list(header_l[4:516])
-    # always
-    enc_start = HEADER_SIZE
-    enc_end = get_int_from_bits(header_l[548:580])
 
-    return f_type, enc_type, file_name, enc_start, enc_end
+def is_file(inp: str) -> bool:
+    """
+    Function that checks if user input is name of existing file, anything else is encoded as text
+    :param inp: user input string
+    :return:  bool
+    """
+    return isfile(inp)
 
 
-def get_string_from_bits_list(bits_l) -> str:
+def load_image(image) -> Image:
     """
-    Function that returns string from bits list
-    :param bits_l: list of bits or string of bits
-    :return: str
+    Function that returns Image from Image, array, file name, bytes or binary file-like object of image file,
+    pixels of image file are decoded at once, so damaged data raise InvalidInputError here
+    :param image: image in any of these forms
+    :return: Image
     """
-    file_name = ''
-    for i in range(0, len(bits_l), 8):
-        file_name += chr(get_int_from_bits(bits_l[i: i + 8]))
+    if isinstance(image, Image.Image):
+        return image
+    if isinstance(image, numpy.ndarray):
+        return Image.fromarray(image)
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = BytesIO(image)
 
-    return file_name
+    name = image if isinstance(image, (str, PathLike)) else getattr(image, 'name', 'data')
+    return load_pixels(open_image(image, name), name)
 
 
-def get_int_from_bits(bits_l: list) -> int:
+def embed(carrier, payload, file_name: str = None, legacy_header: bool = False, workers: int = None,
+          **options) -> Image:
     """
-    Function that return int from bits list
-    :param bits_l: list of bits
-    :return: int
+    Function that encodes payload to image and returns changed image, nothing is saved or printed
+    :param carrier: Image, array, file name, bytes or binary file-like object of image to encode in
+    :param payload: str is encoded as text, bytes, path (os.PathLike) or binary file-like object as file
+    :param file_name: file name to store in header, name of path payload by default
+    :param legacy_header: use old 580 bits header
+    :param workers: number of threads, number of CPUs by default
+    :param options: options of encoding (fields of Options)
+    :return: Image
     """
-    return int(''.join(str(x) for x in bits_l), 2)
+    image = load_image(carrier)
+    if isinstance(options.get('channels'), str):
+        options['channels'] = parse_channels(options['channels'])
+    options = Options(**options)
+    f_type = 1
+
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+        f_type = 0 if file_name is None else 1
+
+    if isinstance(payload, PathLike):
+        file_name = basename(payload) if file_name is None else file_name
+        try:
+            stream = open(payload, 'rb')
+        except FileNotFoundError:
+            raise InvalidInputError('File which you want to encode does not exist.')
+    elif isinstance(payload, (bytes, bytearray, memoryview)):
+        stream = BytesIO(payload)
+    else:
+        stream = payload
 
+    # stream of caller is left open
+    with stream if stream is not payload else nullcontext():
+        options = resolve_compression(options, stream)
+        compressed = compress_stream(stream, options.compression, workers) if options.compression else None
+        with compressed or nullcontext():
+            stream = compressed or stream
+            # size from current position to end of stream
+            position = stream.tell()
+            size = stream.seek(0, SEEK_END) - position
+            stream.seek(position)
 
-def decode_wrapper():
-    user_input = input('What image do you want to decode?\n')
+            header = build_header(f_type, file_name or '', size, options, legacy_header,
+                                  crcs=None if legacy_header else get_chunk_crcs(stream))
+            options = get_header_options(options, header)
+            if size * 8 > get_capacity(image.width, image.height, options):
+                raise CapacityError('The file/text to encode is too big.')
+
+            return encode_stream(image, stream, header, options, workers)
+
+
+def get_metadata(header: tuple) -> dict:
+    """
+    Function that returns header as dict
+    :param header: header tuple
+    :return: dict
+    """
+    return {
+        'type': 'file' if header[0] == 1 else 'text',
+        'enc_type': header[1],
+        'depth': header.options.depth,
+        'channels': get_channel_names(header.options.channels),
+        'stride': header.options.stride,
+        'offset': header.options.offset,
+        'compression': COMPRESSIONS[header.options.compression],
+        'file_name': header[2],
+        'size': get_payload_size(header[1], header[4]) // 8,
+        **({} if header.span is None else header.span._asdict()),
+    }
+
+
+def extract_to(image, output, key: str = None, max_memory: int = None, workers: int = None) -> dict:
+    """
+    Function that writes payload of image to output, nothing is printed
+    :param image: Image, array, file name, bytes or binary file-like object of image to decode
+    :param output: writable binary file-like object
+    :param key: key of pixel order for type 5
+    :param max_memory: memory ceiling in bytes, PNG file is then read by bands of rows
+    :param workers: number of threads, number of CPUs by default
+    :return: dict metadata from header
+    """
+    if isinstance(image, (str, PathLike)) and max_memory and exists(image) and get_band_info(image, max_memory):
+        header = set_key(read_header(image), key)
+        check_whole_payload(header)
+        metadata = get_metadata(header)
+        metadata['size'] = decode_bands(image, header, output, max_memory)
+
+        return metadata
+
+    if isinstance(image, (str, PathLike)):
+        image, header, size = open_for_decode(image, key)
+    else:
+        image = load_image(image)
+        header = set_key(get_header(image), key)
+        size = image.size
+
+    check_whole_payload(header)
+    metadata = get_metadata(header)
+    metadata['size'] = decode_to(image, header, output, size, workers)
+
+    return metadata
+
+
+def extract(image, key: str = None, workers: int = None) -> tuple:
+    """
+    Function that returns payload of image, nothing is printed or saved
+    :param image: Image, array, file name, bytes or binary file-like object of image to decode
+    :param key: key of pixel order for type 5
+    :param workers: number of threads, number of CPUs by default
+    :return: tuple (dict metadata from header, bytes payload)
+    """
+    payload = BytesIO()
+    metadata = extract_to(image, payload, key, workers=workers)
+
+    return metadata, payload.getvalue()
+
+
+def get_info(file_name: str) -> dict:
+    """
+    Function that returns header info of image
+    :param file_name: image file name
+    :return: dict
+    """
+    return dict(image=file_name, **get_metadata(read_header(file_name)))
+
+
+def encode_command(args) -> dict:
+    file_output = args.output[:-4] if args.output.lower().endswith('.png') else args.output
+    start = time.perf_counter()
+    options = Options(args.enc_type, args.depth, parse_channels(args.channels), args.stride, args.offset,
+                      args.key, args.compression)
+    max_memory = args.max_memory and args.max_memory << 20
+    details = {}
+    size = encode_to_file(args.payload, args.carrier, file_output, options, args.resize == 'yes', args.legacy_header,
+                          args.resample, max_memory, args.threads, details)
+    result = {'output': get_output_file(file_output), 'type': 'file' if is_file(args.payload) else 'text', 'size': size,
+              'seconds': time.perf_counter() - start, **details}
+
+    if not args.json:
+        print('Encoded {} bytes of {} to {}.'.format(size, result['type'], result['output']))
+
+    return result
+
+
+def decode_command(args) -> dict:
+    max_memory = args.max_memory and args.max_memory << 20
+    bands = max_memory and get_band_info(args.image, max_memory) if exists(args.image) else None
+
+    if bands:
+        header = set_key(read_header(args.image), args.key)
+        check_whole_payload(header)
+        output = args.output or basename(header[2]) or 'test-out'
+        result = {'image': args.image, 'type': 'file' if header[0] == 1 else 'text',
+                  'bands': get_band_info(args.image, max_memory, header.options)}
+
+        if header[0] == 0:
+            payload = BytesIO()
+            result['size'] = extract_to(args.image, payload, args.key, max_memory)['size']
+            result['text'] = bytes_to_text(payload.getvalue())
+            if not args.json:
+                print('Encoded text is: ', result['text'])
+        else:
+            result['size'] = write_output(
+                output, lambda output_file: extract_to(args.image, output_file, args.key, max_memory)['size'],
+                args.force)
+            result['output'] = output
+            if not args.json:
+                print('Decoded {} bytes to {}.'.format(result['size'], result['output']))
+
+        return result
 
-    # try to open image
     try:
-        image = Image.open(user_input)
+        image, header, size = open_for_decode(args.image, args.key)
     except FileNotFoundError:
-        print('File does not exist.\n')
-        exit(2)
+        raise InvalidInputError('File does not exist.')
+
+    result = {'image': args.image, 'type': 'file' if header[0] == 1 else 'text'}
 
-    header = get_header(image)
-    enc_type = header[1]
-    enc_start = header[3]
-    enc_end = header[4]
-    counter_bits = 0
-    counter_pixels = 0
-    result = ''
+    if header[0] == 0:
+        payload = BytesIO()
+        result['size'] = decode_to(image, header, payload, size, args.threads)
+        result['text'] = bytes_to_text(payload.getvalue())
+        if not args.json:
+            print('Encoded text is: ', result['text'])
+    else:
+        result['output'] = args.output or basename(header[2]) or 'test-out'
+        result['size'] = decode_file(image, header, result['output'], size, args.threads, args.force)
+        if not args.json:
+            print('Decoded {} bytes to {}.'.format(result['size'], result['output']))
 
-    for x in range(image.width):
-        for y in range(image.height):
-            pixels = list(image.getpixel((x, y)))
+    return result
 
-            if counter_bits >= enc_end:
-                break
 
-            if counter_bits >= enc_start and \
-                    (enc_type == 0 or (enc_type == 1 and counter_pixels % 2 == 0)):
-                result += str(pixels[0] & 1)
+def span_encode_command(args) -> dict:
+    file_output = args.output[:-4] if args.output.lower().endswith('.png') else args.output
+    start = time.perf_counter()
+    options = Options(args.enc_type, args.depth, parse_channels(args.channels), args.stride, args.offset,
+                      args.key, args.compression)
+    segments = encode_span(args.payload, args.carriers, file_output, options, workers=args.threads)
+    items = [{'output': output, 'size': size} for output, size in segments]
 
-            counter_bits += 1
+    if not args.json:
+        for index, item in enumerate(items):
+            print('Encoded segment {} of {}, {} bytes to {}.'.format(index + 1, len(items), item['size'],
+                                                                     item['output']))
 
-            if counter_bits >= enc_end:
-                break
+    return {'items': items, 'type': 'file' if is_file(args.payload) else 'text',
+            'size': sum(item['size'] for item in items), 'seconds': time.perf_counter() - start}
 
-            if counter_bits >= enc_start and \
-                    (enc_type == 0 or (enc_type == 1 and counter_pixels % 2 == 0)):
-                result += str(pixels[1] & 1)
 
-            counter_bits += 1
+def span_decode_command(args) -> dict:
+    try:
+        header = read_header(args.images[0])
+    except FileNotFoundError:
+        raise InvalidInputError('File does not exist.')
 
-            if counter_bits >= enc_end:
-                break
+    result = {'images': args.images, 'type': 'file' if header[0] == 1 else 'text'}
 
-            if counter_bits >= enc_start and \
-                    (enc_type == 0 or (enc_type == 1 and counter_pixels % 2 == 0)):
-                result += str(pixels[2] & 1)
+    if header[0] == 0:
+        payload = BytesIO()
+        result['size'] = decode_span(args.images, payload, args.key, args.threads)['size']
+        result['text'] = bytes_to_text(payload.getvalue())
+        if not args.json:
+            print('Encoded text is: ', result['text'])
+    else:
+        result['output'] = args.output or basename(header[2]) or 'test-out'
+        segments = read_segments(args.images, args.key, args.threads)
+        result['size'] = write_output(
+            result['output'], lambda output_file: write_segments(segments, output_file, args.threads)['size'],
+            args.force)
+        if not args.json:
+            print('Decoded {} bytes from {} images to {}.'.format(result['size'], len(args.images),
+                                                                  result['output']))
 
-            counter_bits += 1
+    return result
 
-            if counter_bits >= enc_end:
-                break
 
-            counter_pixels += 1
+def verify_command(args) -> dict:
+    images = []
 
-        if counter_bits >= enc_end:
-            break
+    for file_name in args.images:
+        try:
+            info = dict(image=file_name, **verify_payload(file_name, args.key, args.threads))
+        except StegoError as e:
+            info = {'image': file_name, 'error': str(e)}
 
-    file_name_split = header[2].split('.')
+        images.append(info)
+        if not args.json:
+            print(' '.join('{}: {}'.format(key, value) for key, value in info.items()))
 
-    if header[0] == 0:
-        result = wrap(result, 8)
-        text = ''
-        for i in result:
-            text += get_string_from_bits_list(i)
+    return {'images': images, 'failed': sum('error' in info or bool(info['damaged']) for info in images)}
 
-        print('Encoded text is: ', format(text))
-        exit(2)
-    else:
-        result = wrap(result, 8)
-        bytes_output = []
 
-        for i in result:
-            bytes_output.append(eval("0b" + i))
+def detect_command(args) -> dict:
+    start = time.perf_counter()
+    result = dict(image=args.image, **detect_lsb(args.image, args.points, parse_channels(args.channels)))
+    result['seconds'] = time.perf_counter() - start
 
-        with open('test-out.' + file_name_split[1], "wb") as output_file:
-            output_file.write(bytes(bytes_output))
-            output_file.close()
+    if not args.json:
+        print('Probability of data in whole image: {:.3f}, data are probably in first {:.0%} of image.'.format(
+            result['probability'], result['embedded']))
+        for fraction, probability in result['curve']:
+            print('{:4.0%}: {:.3f}'.format(fraction, probability))
 
+    return result
 
-# TODO how to find out NxN to check??
-def detect_wrapper():
-    user_input = input('Write image name to detect steganography in.\n')
 
-    # try to open image
+def info_command(args) -> dict:
+    images = []
+
+    for file_name in args.images:
+        try:
+            info = get_info(file_name)
+        except (OSError, ValueError, StegoError) as e:
+            info = {'image': file_name, 'error': str(e)}
+
+        images.append(info)
+        if not args.json:
+            print(' '.join('{}: {}'.format(key, value) for key, value in info.items()))
+
+    return {'images': images, 'failed': sum('error' in info for info in images)}
+
+
+def capacity_command(args) -> dict:
+    options = Options(args.enc_type, args.depth, parse_channels(args.channels), args.stride, args.offset,
+                      'key' if args.enc_type == 5 else None)
+    images = []
+
+    for file_name in args.images:
+        try:
+            width, height, alpha = get_image_size(file_name)
+            if options.channels & 0b1000 and not alpha:
+                raise InvalidInputError('Image has no alpha channel to encode in.')
+            layouts = get_layout_capacities(width, height, options, args.size or 0, args.name)
+            info = {'image': file_name, 'width': width, 'height': height, 'alpha': alpha,
+                    'capacity': layouts[options.enc_type], 'layouts': layouts}
+            if args.size is not None:
+                planned = plan_options(file_name, args.size, args.name, options)
+                info.update(depth=planned.depth, channels=get_channel_names(planned.channels))
+        except StegoError as e:
+            info = {'image': file_name, 'error': str(e)}
+
+        images.append(info)
+        if not args.json:
+            print(' '.join('{}: {}'.format(key, value) for key, value in info.items()))
+
+    return {'images': images, 'failed': sum('error' in info for info in images)}
+
+
+def batch_encode_command(args) -> dict:
     try:
-        image = Image.open(user_input)
+        rows = read_manifest(args.manifest)
     except FileNotFoundError:
-        print('File does not exist.\n')
-        exit(2)
+        raise InvalidInputError('File does not exist.')
 
-    for x in range(image.width):
-        for y in range(image.height):
-            pixels = list(image.getpixel((x, y)))
+    results = batch_encode(rows, args.workers, not args.json)
+    items = [
+        {'payload': row[0] if row else None, 'output': get_output_file(row[2]) if len(row) > 2 else None,
+         'error': error, 'size': size, 'seconds': seconds}
+        for row, error, size, seconds in results
+    ]
 
+    return {'items': items, 'failed': sum(item['error'] is not None for item in items)}
 
-def is_file(inp: str) -> bool:
+
+def batch_decode_command(args) -> dict:
+    try:
+        results = batch_decode(args.path, args.output_dir, args.workers, not args.json, args.key, args.force)
+    except FileNotFoundError:
+        raise InvalidInputError('File does not exist.')
+
+    items = [
+        {'image': image_name, 'output': output_name, 'error': error, 'size': size, 'seconds': seconds}
+        for image_name, error, output_name, size, seconds in results
+    ]
+
+    return {'items': items, 'failed': sum(item['error'] is not None for item in items)}
+
+
+def run_benchmark(width: int, height: int, size: int, threads: list, enc_type: int = 0, depth: int = 1,
+                  verbose: bool = True) -> list:
     """
-    Function that checks is file condition
-    :param inp: user input string
-    :return:  bool
+    Function that measures embedding and extraction of random payload in random image for every number of threads,
+    output of every run has to be the same as output of first run
+    :param width: image width
+    :param height: image height
+    :param size: payload size in bytes
+    :param threads: numbers of threads to measure
+    :param enc_type: type of encoding
+    :param depth: number of low bits used in every channel
+    :param verbose: print every run
+    :return: list of dicts (threads, embed seconds, extract seconds, speedup against first run)
+    """
+    generator = numpy.random.default_rng(0)
+    carrier = Image.fromarray(generator.integers(0, 256, (height, width, 3), dtype=numpy.uint8))
+    payload = generator.integers(0, 256, size, dtype=numpy.uint8).tobytes()
+    options = {'enc_type': enc_type, 'depth': depth, 'key': 'benchmark' if enc_type == 5 else None}
+    runs = []
+    first = None
+
+    for workers in threads:
+        start = time.perf_counter()
+        image = embed(carrier, payload, 'payload.bin', workers=workers, **options)
+        embedded = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, extracted = extract(image, options['key'], workers)
+        run = {'threads': workers, 'embed': embedded, 'extract': time.perf_counter() - start}
+
+        pixels = numpy.asarray(image)
+        if first is None:
+            first = pixels, run['embed'] + run['extract']
+        if extracted != payload or not numpy.array_equal(pixels, first[0]):
+            raise StegoError('Output with {} threads differs from output with {} threads.'.format(
+                workers, threads[0]))
+
+        run['speedup'] = first[1] / (run['embed'] + run['extract'])
+        runs.append(run)
+        if verbose:
+            print('threads: {} embed: {:.3f} s extract: {:.3f} s speedup: {:.2f}'.format(
+                workers, run['embed'], run['extract'], run['speedup']))
+
+    return runs
+
+
+def benchmark_command(args) -> dict:
+    threads = args.threads or sorted({1, 2, 4, 8, 16, cpu_count()} & set(range(1, cpu_count() + 1)))
+    options = Options(args.enc_type, args.depth, key='benchmark' if args.enc_type == 5 else None)
+    header = build_header(1, 'payload.bin', 0, options)
+    capacity = get_capacity(args.width, args.height, get_header_options(options, header)) // 8
+    size = capacity // 2 if args.size is None else args.size
+    if size > capacity:
+        raise CapacityError('The file/text to encode is too big.')
+
+    runs = run_benchmark(args.width, args.height, size, threads, args.enc_type, args.depth, not args.json)
+
+    return {'width': args.width, 'height': args.height, 'size': size, 'runs': runs}
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """
+    Function that returns parser of command line arguments
+    :return: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(
+        description='Image steganography program, run without arguments for interactive mode.',
+        epilog='Exit codes: 0 success, 1 some items failed, 2 missing file or wrong input, '
+               '4 data do not fit in image, 5 damaged data, '
+               '42 data too big for header or no header.'
+    )
+    parser.add_argument('--json', action='store_true', help='print result as JSON')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    encode_parser = commands.add_parser('encode', help='encode text or file to image')
+    encode_parser.add_argument('-p', '--payload', required=True,
+                               help='name of existing file to encode, anything else is encoded as text')
+    encode_parser.add_argument('-c', '--carrier', required=True, help='image to encode in')
+    encode_parser.add_argument('-o', '--output', required=True,
+                               help='output image name, saved as PNG unless it ends with .bmp, .ppm, .tif or .tiff')
+    encode_parser.add_argument('-t', '--enc-type', type=int, default=0, choices=range(6),
+                               help='0 every pixel, 1 every even pixel, 2 every odd pixel, 3 every pixel row by row, '
+                                    '4 every stride-th pixel row by row, 5 pixels in order given by key')
+    encode_parser.add_argument('-d', '--depth', type=int, default=1, choices=range(1, 5),
+                               help='number of low bits used in every channel')
+    encode_parser.add_argument('--stride', type=int, default=1, help='use every stride-th pixel, for type 4')
+    encode_parser.add_argument('--offset', type=int, default=0, help='pixels to skip at start, for type 4')
+    encode_parser.add_argument('-k', '--key', help='key of pixel order, for type 5')
+    encode_parser.add_argument('--channels', default='RGB', help='channels to encode in, some of R, G, B and A')
+    encode_parser.add_argument('-z', '--compression', choices=COMPRESSIONS + ('auto',), default='none',
+                               help='compress data before encoding, auto chooses codec by sample of data')
+    encode_parser.add_argument('--legacy-header', action='store_true',
+                               help='use old 580 bits header readable by older versions')
+    encode_parser.add_argument('--resize', choices=('no', 'yes'), default='no',
+                               help='make image bigger when data do not fit')
+    encode_parser.add_argument('--resample', choices=tuple(RESAMPLING), default='box',
+                               help='filter used to make image bigger, nearest is fastest, bilinear smoothest')
+    encode_parser.add_argument('--max-memory', type=int,
+                               help='memory ceiling in MB, PNG image is then processed by bands of rows')
+    encode_parser.add_argument('--threads', type=int, help='number of threads, number of CPUs by default')
+    encode_parser.set_defaults(func=encode_command)
+
+    decode_parser = commands.add_parser('decode', help='decode text or file from image')
+    decode_parser.add_argument('image', help='image to decode')
+    decode_parser.add_argument('-o', '--output', help='output file name, stored file name by default')
+    decode_parser.add_argument('-k', '--key', help='key of pixel order, for type 5')
+    decode_parser.add_argument('--force', action='store_true', help='overwrite existing output file')
+    decode_parser.add_argument('--max-memory', type=int,
+                               help='memory ceiling in MB, PNG image is then read by bands of rows')
+    decode_parser.add_argument('--threads', type=int, help='number of threads, number of CPUs by default')
+    decode_parser.set_defaults(func=decode_command)
+
+    detect_parser = commands.add_parser('detect', help='detect steganography in image')
+    detect_parser.add_argument('image', help='image to check')
+    detect_parser.add_argument('--points', type=int, default=20,
+                               help='number of parts of image in column by column order probability is shown for')
+    detect_parser.add_argument('--channels', default='RGB', help='channels to check, some of R, G, B and A')
+    detect_parser.set_defaults(func=detect_command)
+
+    verify_parser = commands.add_parser('verify', help='check every chunk of payload by its CRC without decoding it')
+    verify_parser.add_argument('images', nargs='+', help='images to check')
+    verify_parser.add_argument('-k', '--key', help='key of pixel order, for images of type 5')
+    verify_parser.add_argument('--threads', type=int, help='number of threads, number of CPUs by default')
+    verify_parser.set_defaults(func=verify_command)
+
+    info_parser = commands.add_parser('info', help='show header of images')
+    info_parser.add_argument('images', nargs='+', help='images to show header of')
+    info_parser.set_defaults(func=info_command)
+
+    capacity_parser = commands.add_parser('capacity', help='show how many bytes fit in images, only image size is read')
+    capacity_parser.add_argument('images', nargs='+', help='images to check')
+    capacity_parser.add_argument('-t', '--enc-type', type=int, default=0, choices=range(6), help='encryption type')
+    capacity_parser.add_argument('-d', '--depth', type=int, default=1, choices=range(1, 5),
+                                 help='number of low bits used in every channel')
+    capacity_parser.add_argument('--stride', type=int, default=1, help='use every stride-th pixel, for type 4')
+    capacity_parser.add_argument('--offset', type=int, default=0, help='pixels to skip at start, for type 4')
+    capacity_parser.add_argument('--channels', default='RGB', help='channels to encode in, some of R, G, B and A')
+    capacity_parser.add_argument('-s', '--size', type=int,
+                                 help='payload size in bytes, lowest depth and fewest channels it fits in are shown')
+    capacity_parser.add_argument('-n', '--name', default='',
+                                 help='file name to be stored in header, leave out for text')
+    capacity_parser.set_defaults(func=capacity_command)
+
+    batch_encode_parser = commands.add_parser('batch-encode', help='encode all rows of manifest')
+    batch_encode_parser.add_argument('manifest', help='CSV file with rows payload,carrier,output'
+                                                      '[,enc_type,depth,channels,stride,offset,key,compression]')
+    batch_encode_parser.add_argument('-w', '--workers', type=int, help='number of processes')
+    batch_encode_parser.set_defaults(func=batch_encode_command)
+
+    batch_decode_parser = commands.add_parser('batch-decode', help='decode all images in directory or list')
+    batch_decode_parser.add_argument('path', help='directory or file with one image name per line')
+    batch_decode_parser.add_argument('-o', '--output-dir', default='.', help='directory for outputs')
+    batch_decode_parser.add_argument('-w', '--workers', type=int, help='number of processes')
+    batch_decode_parser.add_argument('-k', '--key', help='key of pixel order, for images of type 5')
+    batch_decode_parser.add_argument('--force', action='store_true', help='overwrite existing output files')
+    batch_decode_parser.set_defaults(func=batch_decode_command)
+
+    span_encode_parser = commands.add_parser('span-encode', help='spread text or file over several images')
+    span_encode_parser.add_argument('-p', '--payload', required=True,
+                                    help='name of existing file to encode, anything else is encoded as text')
+    span_encode_parser.add_argument('-c', '--carriers', required=True, nargs='+',
+                                    help='images to encode in, used in given order until payload fits')
+    span_encode_parser.add_argument('-o', '--output', required=True,
+                                    help='output image name, number of segment is added to it, saved as PNG')
+    span_encode_parser.add_argument('-t', '--enc-type', type=int, default=0, choices=range(6),
+                                    help='type of encoding, see encode')
+    span_encode_parser.add_argument('-d', '--depth', type=int, default=1, choices=range(1, 5),
+                                    help='number of low bits used in every channel')
+    span_encode_parser.add_argument('--stride', type=int, default=1, help='use every stride-th pixel, for type 4')
+    span_encode_parser.add_argument('--offset', type=int, default=0, help='pixels to skip at start, for type 4')
+    span_encode_parser.add_argument('-k', '--key', help='key of pixel order, for type 5')
+    span_encode_parser.add_argument('--channels', default='RGB', help='channels to encode in, some of R, G, B and A')
+    span_encode_parser.add_argument('-z', '--compression', choices=COMPRESSIONS + ('auto',), default='none',
+                                    help='compress data before encoding, auto chooses codec by sample of data')
+    span_encode_parser.add_argument('--threads', type=int, help='number of threads, number of CPUs by default')
+    span_encode_parser.set_defaults(func=span_encode_command)
+
+    span_decode_parser = commands.add_parser('span-decode', help='join text or file spread over several images')
+    span_decode_parser.add_argument('images', nargs='+', help='images with all segments, in any order')
+    span_decode_parser.add_argument('-o', '--output', help='output file name, stored file name by default')
+    span_decode_parser.add_argument('-k', '--key', help='key of pixel order, for type 5')
+    span_decode_parser.add_argument('--force', action='store_true', help='overwrite existing output file')
+    span_decode_parser.add_argument('--threads', type=int, help='number of threads, number of CPUs by default')
+    span_decode_parser.set_defaults(func=span_decode_command)
+
+    benchmark_parser = commands.add_parser('benchmark', help='measure encoding and decoding with numbers of threads')
+    benchmark_parser.add_argument('--width', type=int, default=4000, help='width of random image')
+    benchmark_parser.add_argument('--height', type=int, default=3000, help='height of random image')
+    benchmark_parser.add_argument('-s', '--size', type=int, help='payload size in bytes, half of capacity by default')
+    benchmark_parser.add_argument('-t', '--enc-type', type=int, default=0, choices=range(6), help='type of encoding')
+    benchmark_parser.add_argument('-d', '--depth', type=int, default=1, choices=range(1, 5),
+                                  help='number of low bits used in every channel')
+    benchmark_parser.add_argument('--threads', type=int, nargs='+', help='numbers of threads, 1 to number of CPUs '
+                                                                         'by default')
+    benchmark_parser.set_defaults(func=benchmark_command)
+
+    return parser
+
+
+def cli(argv: list) -> int:
+    """
+    Function that runs command given by command line arguments
+    :param argv: command line arguments
+    :return: int exit code
     """
-    return '.jpg' in inp or '.jpeg' in inp or '.txt' in inp or '.png' in inp
+    args = get_parser().parse_args(argv)
+
+    try:
+        result = args.func(args)
+        code = 1 if result.get('failed') else 0
+    except StegoError as e:
+        result = {'error': str(e)}
+        code = e.code
+        if not args.json:
+            print(e, file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(dict(result, command=args.command, code=code)))
+
+    return code
 
 
 def main():
+    if len(sys.argv) > 1:
+        exit(cli(sys.argv[1:]))
+
     what_to_do = input('What do you want to do?\n'
                        '0: Encode,\n'
                        '1: Decode,\n'
-                       '2: Detect\n')
-    if what_to_do == "0":
-        encode_wrapper()
-    elif what_to_do == "1":
-        decode_wrapper()
-    elif what_to_do == "2":
-        detect_wrapper()
-    else:
-        print('Do not be an idiot.\n')
-        exit(5)
+                       '2: Detect,\n'
+                       '3: Info,\n'
+                       '4: Batch encode,\n'
+                       '5: Batch decode\n')
+    try:
+        if what_to_do == "0":
+            encode_wrapper()
+        elif what_to_do == "1":
+            decode_wrapper()
+        elif what_to_do == "2":
+            detect_wrapper()
+        elif what_to_do == "3":
+            info_wrapper()
+        elif what_to_do == "4":
+            batch_encode_wrapper()
+        elif what_to_do == "5":
+            batch_decode_wrapper()
+        else:
+            print('Do not be an idiot.\n')
+            exit(5)
+    except StegoError as e:
+        print('{}\n'.format(e))
+        exit(e.code)
 
 
 if __name__ == '__main__':